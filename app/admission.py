@@ -0,0 +1,145 @@
+# app/admission.py
+"""
+Admission control in front of the DB pool (ADMISSION_ENABLED=true).
+
+A burst past what the pool can serve otherwise piles requests up in the
+threadpool, each waiting up to DB_POOL_TIMEOUT for a connection, and a pay that
+finally times out has already claimed its idempotency key. Here a request has to
+get a slot before its handler runs:
+
+  - at most ADMISSION_MAX_CONCURRENCY requests run at once (default: pool size +
+    overflow), and optionally fewer per endpoint (ADMISSION_ENDPOINT_LIMITS)
+  - the rest wait in a short queue; writes (pay / refund / checkout) are always
+    admitted before reads (order / ledger / summary)
+  - a full queue, or a wait longer than ADMISSION_QUEUE_TIMEOUT_SECS, answers
+    503 with Retry-After straight away, before any key is claimed or any
+    connection is checked out
+
+Slots are per process and live on the event loop, so the dependency is async
+(the handler itself may still be sync).
+"""
+import asyncio
+from collections import Counter, deque
+from time import perf_counter
+from typing import Deque, Dict, Tuple
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.metrics import admission_in_flight, admission_queue_depth, admission_queue_wait, admission_shed
+
+WRITE, READ = 0, 1  # lower is served first
+_PRIORITY_NAMES = {WRITE: "write", READ: "read"}
+
+SHED_DETAIL = "Server busy, retry later"
+
+
+class AdmissionController:
+    def __init__(
+        self, capacity: int, endpoint_limits: Dict[str, int], queue_limits: Dict[int, int], queue_timeout: float,
+    ):
+        self.capacity = max(1, capacity)
+        self.endpoint_limits = endpoint_limits
+        self.queue_limits = queue_limits
+        self.queue_timeout = queue_timeout
+        self.in_use = 0
+        self._per_endpoint: Counter = Counter()
+        self._waiters: Dict[int, Deque[Tuple[str, asyncio.Future]]] = {WRITE: deque(), READ: deque()}
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        return cls(
+            capacity=settings.admission_max_concurrency or settings.db_pool_size + settings.db_max_overflow,
+            endpoint_limits=settings.admission_endpoint_limits,
+            queue_limits={WRITE: settings.admission_max_queue_writes, READ: settings.admission_max_queue_reads},
+            queue_timeout=settings.admission_queue_timeout_secs,
+        )
+
+    def _can_run(self, endpoint: str) -> bool:
+        limit = self.endpoint_limits.get(endpoint)
+        return self.in_use < self.capacity and (limit is None or self._per_endpoint[endpoint] < limit)
+
+    def _take(self, endpoint: str) -> None:
+        self.in_use += 1
+        self._per_endpoint[endpoint] += 1
+        admission_in_flight.labels(endpoint).inc()
+
+    async def acquire(self, endpoint: str, priority: int) -> None:
+        """Take a slot or raise 503; a queued request is woken by release()."""
+        waiting = self._waiters[priority]
+        # release() hands free slots to queued requests right away, so anyone still
+        # queued while we can run is held back by their own endpoint limit
+        if self._can_run(endpoint):
+            self._take(endpoint)
+            admission_queue_wait.labels(_PRIORITY_NAMES[priority]).observe(0)
+            return
+        if len(waiting) >= self.queue_limits[priority]:
+            self._shed(endpoint, "queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (endpoint, fut)
+        waiting.append(entry)
+        admission_queue_depth.labels(_PRIORITY_NAMES[priority]).inc()
+        start = perf_counter()
+        try:
+            # shield: a timeout must not cancel a grant that raced with it
+            await asyncio.wait_for(asyncio.shield(fut), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not fut.done():
+                waiting.remove(entry)
+                self._shed(endpoint, "timeout")
+        except asyncio.CancelledError:  # client went away while queued
+            if fut.done():
+                self.release(endpoint)
+            else:
+                waiting.remove(entry)
+            raise
+        finally:
+            admission_queue_depth.labels(_PRIORITY_NAMES[priority]).dec()
+            admission_queue_wait.labels(_PRIORITY_NAMES[priority]).observe(perf_counter() - start)
+
+    def release(self, endpoint: str) -> None:
+        self.in_use -= 1
+        self._per_endpoint[endpoint] -= 1
+        admission_in_flight.labels(endpoint).dec()
+        self._wake()
+
+    def _wake(self) -> None:
+        # Highest priority first, FIFO within a priority; skip waiters whose endpoint is at its limit
+        for priority in sorted(self._waiters):
+            waiting = self._waiters[priority]
+            for entry in list(waiting):
+                if self.in_use >= self.capacity:
+                    return
+                endpoint, fut = entry
+                if self._can_run(endpoint):
+                    waiting.remove(entry)
+                    self._take(endpoint)
+                    fut.set_result(None)
+
+    def _shed(self, endpoint: str, reason: str) -> None:
+        admission_shed.labels(endpoint, reason).inc()
+        raise HTTPException(
+            status_code=503, detail=SHED_DETAIL,
+            headers={"Retry-After": str(settings.admission_retry_after_secs)},
+        )
+
+
+controller = AdmissionController.from_settings()
+
+
+def admit(endpoint: str, priority: int):
+    """Route dependency: hold an admission slot for the whole request."""
+
+    async def dependency():
+        if not settings.admission_enabled:
+            yield
+            return
+        limiter = controller  # the same instance releases what it granted
+        await limiter.acquire(endpoint, priority)
+        try:
+            yield
+        finally:
+            limiter.release(endpoint)
+
+    return dependency
@@ -0,0 +1,114 @@
+# app/async_routes.py
+"""
+Async handlers for the hot endpoints, used when ASYNC_DB=true.
+
+Same paths and responses as the sync handlers in app/main.py, but they run on the
+event loop against the async engine, so a request waiting on Postgres doesn't
+hold one of Starlette's threadpool threads.
+"""
+from typing import List
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import Response
+
+from app.admission import READ, WRITE, admit
+from app.db_async import AsyncSessionLocal
+from app.etag import not_modified, not_modified_response, order_etag, version_stmt
+from app.models import Order
+from app.replica import ReadPreference, read_preference, async_read_session, lsn_headers_async
+from app.schemas import OrderCreate, OrderDetail, OrderOut, LedgerEntryOut, LedgerSummaryOut
+from app.services.payments import pay_order_idempotent_async
+from app.services.refunds import refund_order_idempotent_async
+from app.services.checkout import checkout_idempotent_async
+from app.services.ledger import order_ledger_async, order_ledger_summary_async
+
+router = APIRouter()
+
+
+@router.post("/orders/{order_id}/pay", tags=["orders"], dependencies=[Depends(admit("pay", WRITE))])
+async def pay_order(order_id: UUID, Idempotency_Key: str = Header(alias="Idempotency-Key")):
+    if not Idempotency_Key:
+        raise HTTPException(status_code=400, detail="Missing Idempotency-Key header")
+    async with AsyncSessionLocal() as db:
+        status_code, body, content_type = await pay_order_idempotent_async(db, order_id, Idempotency_Key)
+        headers = await lsn_headers_async(db)
+        return Response(content=body, status_code=status_code, media_type=content_type, headers=headers)
+
+@router.post("/orders/{order_id}/refund", tags=["orders"], dependencies=[Depends(admit("refund", WRITE))])
+async def refund_order(order_id: UUID, Idempotency_Key: str = Header(alias="Idempotency-Key")):
+    if not Idempotency_Key:
+        raise HTTPException(status_code=400, detail="Missing Idempotency-Key header")
+    async with AsyncSessionLocal() as db:
+        status_code, body, content_type = await refund_order_idempotent_async(db, order_id, Idempotency_Key)
+        headers = await lsn_headers_async(db)
+        return Response(content=body, status_code=status_code, media_type=content_type, headers=headers)
+
+@router.post(
+    "/checkout", response_model=OrderOut, tags=["orders"],
+    dependencies=[Depends(admit("checkout", WRITE))],
+)
+async def checkout(payload: OrderCreate, Idempotency_Key: str = Header(alias="Idempotency-Key")):
+    if not Idempotency_Key:
+        raise HTTPException(status_code=400, detail="Missing Idempotency-Key header")
+    async with AsyncSessionLocal() as db:
+        status_code, body, content_type = await checkout_idempotent_async(db, payload, Idempotency_Key)
+        headers = await lsn_headers_async(db)
+        return Response(content=body, status_code=status_code, media_type=content_type, headers=headers)
+
+@router.get(
+    "/orders/{order_id}", response_model=OrderDetail, tags=["orders"],
+    dependencies=[Depends(admit("order", READ))],
+)
+async def get_order(
+    order_id: UUID, response: Response,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    async with await async_read_session(pref) as db:
+        order = await db.get(Order, order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Order not found")
+        etag = order_etag(order.version)
+        if not_modified(if_none_match, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+        return order
+
+@router.get(
+    "/orders/{order_id}/ledger", response_model=List[LedgerEntryOut], tags=["ledger"],
+    dependencies=[Depends(admit("ledger", READ))],
+)
+async def get_order_ledger(
+    order_id: UUID, response: Response,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    async with await async_read_session(pref) as db:
+        version = await db.scalar(version_stmt(order_id))
+        if version is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        etag = order_etag(version)
+        if not_modified(if_none_match, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+        return await order_ledger_async(db, order_id)
+
+@router.get(
+    "/orders/{order_id}/ledger/summary", response_model=LedgerSummaryOut, tags=["ledger"],
+    dependencies=[Depends(admit("ledger_summary", READ))],
+)
+async def get_order_ledger_summary(
+    order_id: UUID, response: Response,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    async with await async_read_session(pref) as db:
+        version = await db.scalar(version_stmt(order_id))
+        if version is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        etag = order_etag(version)
+        if not_modified(if_none_match, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+        return await order_ledger_summary_async(db, order_id)
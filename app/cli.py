@@ -0,0 +1,96 @@
+# app/cli.py
+"""
+Operational commands:
+
+    python -m app.cli migrate
+    python -m app.cli ensure-partitions
+    python -m app.cli rebuild-balances
+    python -m app.cli gc-idempotency
+    python -m app.cli reconcile
+"""
+import argparse
+import json
+import sys
+from datetime import timedelta
+
+from app.config import settings
+from app.db import SessionLocal, engine
+
+
+def cmd_migrate(args: argparse.Namespace) -> None:
+    from app.migrations import migrate, SCHEMA_VERSION
+
+    applied = migrate(engine)
+    print(json.dumps({"applied": applied, "schema_version": SCHEMA_VERSION}))
+
+
+def cmd_ensure_partitions(args: argparse.Namespace) -> None:
+    from app.migrations import ensure_ledger_partitions
+
+    with engine.begin() as conn:
+        partitions = ensure_ledger_partitions(conn, args.months_ahead)
+    print(json.dumps({"partitions": partitions}))
+
+
+def cmd_rebuild_balances(args: argparse.Namespace) -> None:
+    from app.services.balances import rebuild_balances
+
+    with SessionLocal() as db:
+        counts = rebuild_balances(db)
+    print(json.dumps({"rebuilt": counts}))
+
+
+def cmd_gc_idempotency(args: argparse.Namespace) -> None:
+    from app.services.idempotency_gc import sweep_expired_keys
+
+    deleted = sweep_expired_keys(
+        engine, timedelta(hours=args.retention_hours), args.batch_size, args.pause_secs,
+    )
+    print(json.dumps({"deleted": deleted}))
+
+
+def cmd_reconcile(args: argparse.Namespace) -> None:
+    from app.services.reconciliation import reconcile
+
+    report = reconcile(
+        engine, ranges=args.ranges, workers=args.workers,
+        checkpoint=args.checkpoint or None, sample_limit=args.sample_limit,
+    )
+    print(json.dumps(report))
+    if not report["ok"]:
+        sys.exit(1)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="MintGuard maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="Apply pending schema migrations")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("ensure-partitions", help="Create upcoming monthly ledger_entries partitions (run from cron)")
+    p.add_argument("--months-ahead", type=int, default=settings.ledger_partitions_ahead)
+    p.set_defaults(func=cmd_ensure_partitions)
+
+    p = sub.add_parser("rebuild-balances", help="Recompute balance tables from ledger_lines")
+    p.set_defaults(func=cmd_rebuild_balances)
+
+    p = sub.add_parser("gc-idempotency", help="Delete idempotency keys past the retention window")
+    p.add_argument("--retention-hours", type=float, default=settings.idempotency_retention_hours)
+    p.add_argument("--batch-size", type=int, default=settings.idempotency_gc_batch_size)
+    p.add_argument("--pause-secs", type=float, default=settings.idempotency_gc_pause_secs)
+    p.set_defaults(func=cmd_gc_idempotency)
+
+    p = sub.add_parser("reconcile", help="Check that the ledger balances (exits 1 on discrepancies)")
+    p.add_argument("--ranges", type=int, default=settings.reconcile_ranges)
+    p.add_argument("--workers", type=int, default=settings.reconcile_workers)
+    p.add_argument("--checkpoint", default=settings.reconcile_checkpoint, help="'' disables checkpointing")
+    p.add_argument("--sample-limit", type=int, default=20)
+    p.set_defaults(func=cmd_reconcile)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
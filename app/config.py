@@ -1,3 +1,5 @@
+from typing import Dict, Literal, Optional
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -5,6 +7,92 @@ class Settings(BaseSettings):
     # Map the env var named DATABASE_URL to this field
     database_url: str = Field(alias="DATABASE_URL")
 
+    # Optional read replica for GET endpoints. Requests can ask for read-your-writes
+    # (X-Read-Your-Writes: true) or a minimum LSN (X-Min-LSN, from a write's X-LSN
+    # header); when the replica hasn't replayed that far they are served by the primary.
+    read_database_url: Optional[str] = Field(default=None, alias="READ_DATABASE_URL")
+
+    # Serve pay/refund/order/ledger reads from async handlers on an async engine
+    # instead of sync handlers in Starlette's threadpool
+    async_db: bool = Field(default=False, alias="ASYNC_DB")
+
+    # Boot behaviour. "migrate" applies pending migrations and creates upcoming ledger
+    # partitions; "verify" runs no DDL and only checks the schema version (run
+    # `python -m app.cli migrate` / `ensure-partitions` from the deploy pipeline or cron).
+    startup_mode: Literal["migrate", "verify"] = Field(default="migrate", alias="STARTUP_MODE")
+    # Pool connections to open in the background right after boot (0 = lazily on demand)
+    db_pool_warm: int = Field(default=0, alias="DB_POOL_WARM")
+
+    # Connection pool (per engine, per process): pool_size kept open + max_overflow
+    # burst connections; a checkout waits up to pool_timeout seconds before failing.
+    # pool_recycle replaces connections older than N seconds (-1 = never); pre-ping
+    # costs a round trip per checkout, so it can be turned off when recycle is set
+    # below the server/proxy idle timeout.
+    db_pool_size: int = Field(default=5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(default=-1, alias="DB_POOL_RECYCLE")
+    db_pool_pre_ping: bool = Field(default=True, alias="DB_POOL_PRE_PING")
+
+    # Log statements slower than this many milliseconds (0 disables)
+    db_slow_query_ms: float = Field(default=500.0, alias="DB_SLOW_QUERY_MS")
+
+    # Rows per (account, currency) rollup; more shards = less lock contention on hot accounts
+    balance_shards: int = Field(default=8, alias="BALANCE_SHARDS")
+
+    # Where new ledger rows go: "entries" (ledger_entries, one uuid row per line) or
+    # "journal" (journal_transactions + postings, BIGINT / SMALLINT keys). Reads see
+    # both through the ledger_lines view, so the switch needs no backfill.
+    ledger_model: Literal["entries", "journal"] = Field(default="entries", alias="LEDGER_MODEL")
+
+    # Monthly ledger_entries partitions to keep created ahead of time
+    ledger_partitions_ahead: int = Field(default=3, alias="LEDGER_PARTITIONS_AHEAD")
+
+    # Idempotency key retention + background sweeper
+    idempotency_retention_hours: float = Field(default=168.0, alias="IDEMPOTENCY_RETENTION_HOURS")
+    idempotency_gc_enabled: bool = Field(default=False, alias="IDEMPOTENCY_GC_ENABLED")
+    idempotency_gc_interval_secs: float = Field(default=300.0, alias="IDEMPOTENCY_GC_INTERVAL_SECS")
+    idempotency_gc_batch_size: int = Field(default=1000, alias="IDEMPOTENCY_GC_BATCH_SIZE")
+    idempotency_gc_pause_secs: float = Field(default=0.1, alias="IDEMPOTENCY_GC_PAUSE_SECS")
+
+    # Opt-in: a duplicate of an in-flight request waits up to this long for the owner to
+    # finish and then replays its response (0 = answer 425 immediately). Each waiter
+    # holds a pool connection while it waits.
+    idempotency_wait_secs: float = Field(default=0.0, alias="IDEMPOTENCY_WAIT_SECS")
+
+    # Group commit: pay/refund requests arriving within the window (or until max_batch
+    # are queued) share one transaction and one COMMIT; each caller is answered only
+    # after that commit succeeds.
+    group_commit_enabled: bool = Field(default=False, alias="GROUP_COMMIT_ENABLED")
+    group_commit_window_ms: float = Field(default=2.0, alias="GROUP_COMMIT_WINDOW_MS")
+    group_commit_max_batch: int = Field(default=64, alias="GROUP_COMMIT_MAX_BATCH")
+
+    # In-process cache of completed idempotent responses (0 disables it)
+    idempotency_cache_size: int = Field(default=10_000, alias="IDEMPOTENCY_CACHE_SIZE")
+    idempotency_cache_ttl_secs: float = Field(default=300.0, alias="IDEMPOTENCY_CACHE_TTL_SECS")
+
+    # Admission control in front of the DB pool (see app/admission.py). Concurrency
+    # 0 = pool size + overflow; endpoint limits are JSON, e.g. {"ledger": 4}; writes
+    # are admitted before reads; a full queue or a longer wait is shed with 503.
+    admission_enabled: bool = Field(default=False, alias="ADMISSION_ENABLED")
+    admission_max_concurrency: int = Field(default=0, alias="ADMISSION_MAX_CONCURRENCY")
+    admission_endpoint_limits: Dict[str, int] = Field(default_factory=dict, alias="ADMISSION_ENDPOINT_LIMITS")
+    admission_max_queue_writes: int = Field(default=64, alias="ADMISSION_MAX_QUEUE_WRITES")
+    admission_max_queue_reads: int = Field(default=16, alias="ADMISSION_MAX_QUEUE_READS")
+    admission_queue_timeout_secs: float = Field(default=1.0, alias="ADMISSION_QUEUE_TIMEOUT_SECS")
+    admission_retry_after_secs: int = Field(default=1, alias="ADMISSION_RETRY_AFTER_SECS")
+
+    # Ledger reconciliation job: order_id ranges, parallel connections, and the
+    # checkpoint file an interrupted run resumes from
+    reconcile_ranges: int = Field(default=64, alias="RECONCILE_RANGES")
+    reconcile_workers: int = Field(default=4, alias="RECONCILE_WORKERS")
+    reconcile_checkpoint: str = Field(default=".reconcile-checkpoint.json", alias="RECONCILE_CHECKPOINT")
+
+    # OpenTelemetry spans for the pay / refund phases (needs opentelemetry-api)
+    tracing_enabled: bool = Field(default=False, alias="TRACING_ENABLED")
+    # Enables the /admin endpoints (X-Admin-Token header); unset = they answer 404
+    admin_token: Optional[str] = Field(default=None, alias="ADMIN_TOKEN")
+
     # Pydantic v2-style config: read .env and ignore extra env vars
     model_config = SettingsConfigDict(
         env_file=".env",
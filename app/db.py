@@ -1,11 +1,149 @@
-from sqlalchemy import create_engine, text
+import logging
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.config import settings
+from app.metrics import db_pool_checkout_wait, db_pool_connections, db_statement_latency, db_slow_queries
+
+log = logging.getLogger(__name__)
+
+# Route path of the request being served (set by an app-level dependency in main);
+# labels statement metrics with the endpoint that issued them.
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+
+
+class _TimedCheckout:
+    """Observe how long a checkout waits for a free (or newly opened) connection."""
+    label: str
+
+    def connect(self):
+        # Timed around the public entry point: QueuePool._do_get recurses into itself
+        # while it waits for overflow room, which would count one checkout several times
+        start = perf_counter()
+        try:
+            return super().connect()
+        finally:
+            db_pool_checkout_wait.labels(self.label).observe(perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    label = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    label = "async"
+
+
+class TimedReplicaQueuePool(_TimedCheckout, QueuePool):
+    label = "replica"
+
+
+class TimedAsyncReplicaQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    label = "async_replica"
+
+
+def pool_options() -> dict:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+def _statement_kind(statement: str) -> str:
+    head = statement.lstrip()[:6].upper()
+    return head if head in _KINDS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_start"].pop()
+    kind, endpoint = _statement_kind(statement), current_endpoint.get()
+    db_statement_latency.labels(kind, endpoint).observe(elapsed)
+    if settings.db_slow_query_ms and elapsed * 1000 >= settings.db_slow_query_ms:
+        db_slow_queries.labels(kind, endpoint).inc()
+        # Statement text only: parameters may carry customer data
+        log.warning("slow query (%.1f ms, %s): %s", elapsed * 1000, endpoint, statement[:1000])
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute doesn't fire for failed statements; drop their start time
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _report_pool(pool, in_use: int, idle: int) -> None:
+    # Plain set() (not set_function) so it also works in multiprocess mode
+    label = getattr(pool, "label", "sync")
+    db_pool_connections.labels(label, "in_use").set(in_use)
+    db_pool_connections.labels(label, "idle").set(idle)
+
+
+def instrument(engine: Engine) -> None:
+    """Statement timing hooks and the in-use / idle pool gauges."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    # engine.pool is looked up per event: dispose() swaps in a new pool (same listeners)
+    def _on_checkout(dbapi_conn, record, proxy):
+        pool = engine.pool
+        _report_pool(pool, pool.checkedout(), pool.checkedin())
+
+    def _on_checkin(dbapi_conn, record):
+        # Fires just before the connection goes back: it still counts as checked out,
+        # and it is kept idle unless the pool is already full (an overflow one closes)
+        pool = engine.pool
+        _report_pool(pool, pool.checkedout() - 1, min(pool.checkedin() + 1, pool.size()))
+
+    event.listen(engine.pool, "checkout", _on_checkout)
+    event.listen(engine.pool, "checkin", _on_checkin)
+
+
+engine = create_engine(settings.database_url, poolclass=TimedQueuePool, **pool_options())
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+instrument(engine)
+
+# Read-only replica for GET endpoints (see app/replica.py); the primary when unset
+read_engine = engine
+if settings.read_database_url:
+    read_engine = create_engine(settings.read_database_url, poolclass=TimedReplicaQueuePool, **pool_options())
+    instrument(read_engine)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+# The async twin lives in app/db_async.py, imported only when ASYNC_DB=true.
 
 def ping_db() -> bool:
     with engine.connect() as conn:
         conn.execute(text("SELECT 1"))
     return True
+
+def warm_pool(engine: Engine, n: int) -> int:
+    """
+    Open up to `n` pooled connections (capped at pool_size) and hand them back idle,
+    so the first requests after boot don't pay for TCP + auth + TLS. Returns the
+    number opened.
+    """
+    conns = []
+    try:
+        for _ in range(min(n, engine.pool.size())):
+            conn = engine.connect()
+            conns.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
@@ -0,0 +1,37 @@
+# app/db_async.py
+"""
+Async twin of app/db.py (psycopg async driver, same DATABASE_URL and pool settings).
+
+Kept separate so the sqlalchemy.ext.asyncio stack is only imported when
+ASYNC_DB=true. Nothing connects until first use.
+"""
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.config import settings
+from app.db import TimedAsyncQueuePool, TimedAsyncReplicaQueuePool, instrument, pool_options
+
+async_engine = create_async_engine(settings.database_url, poolclass=TimedAsyncQueuePool, **pool_options())
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+instrument(async_engine.sync_engine)
+
+async_read_engine = async_engine
+if settings.read_database_url:
+    async_read_engine = create_async_engine(
+        settings.read_database_url, poolclass=TimedAsyncReplicaQueuePool, **pool_options(),
+    )
+    instrument(async_read_engine.sync_engine)
+AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+
+
+async def warm_async_pool(n: int) -> int:
+    """Async counterpart of app.db.warm_pool: open up to `n` connections concurrently."""
+    conns = [async_engine.connect() for _ in range(min(n, async_engine.pool.size()))]
+    opened = await asyncio.gather(*(c.start() for c in conns))
+    try:
+        await asyncio.gather(*(c.execute(text("SELECT 1")) for c in opened))
+    finally:
+        await asyncio.gather(*(c.close() for c in opened))
+    return len(opened)
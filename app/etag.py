@@ -0,0 +1,38 @@
+# app/etag.py
+"""
+Conditional GETs for an order and its ledger.
+
+Every change to an order or its ledger bumps orders.version (pay, refund, batch
+pay, group commit), so the version is a strong validator for the order, its
+ledger lines and its ledger summary alike. A poll that sends the last ETag back
+in If-None-Match gets a 304 after a one-column primary key lookup; the ledger
+rows are never loaded or serialised.
+"""
+from typing import Optional
+from uuid import UUID
+
+from fastapi.responses import Response
+from sqlalchemy import select
+
+from app.models import Order
+
+
+def order_etag(version: int) -> str:
+    return f'"v{version}"'
+
+
+def version_stmt(order_id: UUID):
+    return select(Order.version).where(Order.id == order_id)
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match matches `etag` (weak comparison, as RFC 9110 asks for this header)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
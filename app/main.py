@@ -1,28 +1,108 @@
-from fastapi import FastAPI, HTTPException, Header
-from fastapi.responses import JSONResponse
-from uuid import UUID, uuid4
-from sqlalchemy import select, func  
-from typing import List
-from contextlib import asynccontextmanager
-from app.db import engine, SessionLocal, ping_db
-from app.models import Base, Order, OrderStatus, LedgerEntry
-from app.schemas import OrderCreate, OrderOut, OrderDetail, LedgerEntryOut, LedgerSummaryOut
-from app.services.payments import pay_order_idempotent  # <-- use the service
+from fastapi import Depends, FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from datetime import datetime, timezone
+from uuid import UUID
+from typing import List, Literal
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import logging
+import os
+import secrets
+import threading
+from app.config import settings
+from app.admission import READ, WRITE, admit
+from app.db import engine, SessionLocal, ping_db, warm_pool, current_endpoint
+from app.etag import not_modified, not_modified_response, order_etag, version_stmt
+from app.models import Order
+from app.replica import ReadPreference, read_preference, read_session, read_bind, lsn_headers
+from app.schemas import (
+    OrderCreate, OrderOut, OrderDetail, LedgerEntryOut, LedgerSummaryOut,
+    OrderBatchCreate, OrderBatchOut, PaymentBatchIn, PaymentBatchOut,
+    AccountBalanceOut, UserBalanceOut, OrderPage, LedgerPage, OrderStatus,
+)
+from app.services.orders import order_values, create_orders_batch, list_orders
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.payments import pay_order_idempotent, pay_orders_batch  # <-- use the service
 from app.services.refunds import refund_order_idempotent
-from app.metrics import metrics_asgi_app 
+from app.services.checkout import checkout_idempotent
+from app.services.ledger import order_ledger, order_ledger_page, order_ledger_summary
+from app.services.balances import account_balance, user_balance
+from app.services.ledger_export import MEDIA_TYPES, accepts_gzip, stream_ledger
+from app.metrics import metrics_asgi_app, mark_worker_dead
+from app.middleware import RequestMetricsMiddleware
+from app.profiler import MAX_SECONDS, ProfilerBusy, folded, sample
+
+log = logging.getLogger(__name__)
+
+async def warm_pools(n: int) -> None:
+    # Best effort: a failure here only means the first requests connect lazily
+    try:
+        opened = await asyncio.to_thread(warm_pool, engine, n)
+        if settings.async_db:
+            from app.db_async import warm_async_pool
+            opened += await warm_async_pool(n)
+        log.info("warmed %d pool connections", opened)
+    except Exception:
+        log.exception("pool warmup failed")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # runs once at startup
-    Base.metadata.create_all(bind=engine)
+    if settings.startup_mode == "verify":
+        # no DDL at boot: migrations/partitions are run by the deploy pipeline
+        from app.migrations import verify_schema
+        verify_schema(engine)
+    else:
+        # apply pending migrations, keep ledger partitions ahead
+        from app.migrations import migrate, ensure_ledger_partitions
+        migrate(engine)
+        with engine.begin() as conn:
+            ensure_ledger_partitions(conn, settings.ledger_partitions_ahead)
+
+    warmup = asyncio.create_task(warm_pools(settings.db_pool_warm)) if settings.db_pool_warm else None
+
+    if settings.group_commit_enabled:
+        from app.services.group_commit import group_committer
+        group_committer.start()
+
+    sweeper, stop_sweeper = None, threading.Event()
+    if settings.idempotency_gc_enabled:
+        from app.services.idempotency_gc import run_sweeper
+        sweeper = asyncio.create_task(run_sweeper(engine, stop_sweeper))
     yield
-    # runs once at shutdown (nothing to clean up for now)
+    # runs once at shutdown
+    if warmup is not None:
+        warmup.cancel()
+        with suppress(asyncio.CancelledError):
+            await warmup
+    if sweeper is not None:
+        stop_sweeper.set()
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    if settings.group_commit_enabled:
+        group_committer.stop()  # drains the queue first
+    if settings.async_db:
+        from app.db_async import async_engine
+        await async_engine.dispose()
+    mark_worker_dead(os.getpid())
 
-app = FastAPI(title="MintGuard Payments", lifespan=lifespan)
+async def tag_endpoint(request: Request) -> None:
+    # Async, so it runs in the request's task: the value is visible to the handler,
+    # including sync handlers (the threadpool copies the context).
+    current_endpoint.set(request.scope["route"].path)
 
+app = FastAPI(title="MintGuard Payments", lifespan=lifespan, dependencies=[Depends(tag_endpoint)])
 
+
+app.add_middleware(RequestMetricsMiddleware)
 app.mount("/metrics", metrics_asgi_app)   
 
+if settings.async_db:
+    # Registered before the sync handlers below, so these win for the same paths
+    from app.async_routes import router as async_router
+    app.include_router(async_router)
+
 
 @app.get("/")
 def root():
@@ -37,74 +117,210 @@ def healthz():
         return {"ok": False, "db": "down"}
 
 @app.post("/orders", response_model=OrderOut, tags=["orders"])
-def create_order(payload: OrderCreate):
-    currency = payload.currency.upper()
+def create_order(payload: OrderCreate, response: Response):
     with SessionLocal() as db:
-        order = Order(
-            id=uuid4(),
-            user_id=payload.user_id,
-            amount_cents=payload.amount_cents,
-            currency=currency,
-            status=OrderStatus.PENDING,
-        )
+        order = Order(**order_values(payload))
         db.add(order)
         db.commit()
         db.refresh(order)
+        response.headers.update(lsn_headers(db))
         return order
 
-@app.post("/orders/{order_id}/pay", tags=["orders"])
+@app.post("/orders:batch", response_model=OrderBatchOut, tags=["orders"])
+def create_orders(payload: OrderBatchCreate):
+    with SessionLocal() as db:
+        results = create_orders_batch(db, payload.orders)
+    created = sum(1 for r in results if "order" in r)
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@app.post("/orders/{order_id}/pay", tags=["orders"], dependencies=[Depends(admit("pay", WRITE))])
 def pay_order(order_id: UUID, Idempotency_Key: str = Header(alias="Idempotency-Key")):
     if not Idempotency_Key:
         raise HTTPException(status_code=400, detail="Missing Idempotency-Key header")
     with SessionLocal() as db:
-        status_code, body = pay_order_idempotent(db, order_id, Idempotency_Key)
-        return JSONResponse(status_code=status_code, content=body)
-@app.get("/orders/{order_id}", response_model=OrderDetail, tags=["orders"])
-def get_order(order_id: UUID):
+        status_code, body, content_type = pay_order_idempotent(db, order_id, Idempotency_Key)
+        return Response(content=body, status_code=status_code, media_type=content_type, headers=lsn_headers(db))
+
+@app.post(
+    "/checkout", response_model=OrderOut, tags=["orders"],
+    dependencies=[Depends(admit("checkout", WRITE))],
+)
+def checkout(payload: OrderCreate, Idempotency_Key: str = Header(alias="Idempotency-Key")):
+    # Create + pay in one idempotent transaction (replaces POST /orders then /orders/{id}/pay)
+    if not Idempotency_Key:
+        raise HTTPException(status_code=400, detail="Missing Idempotency-Key header")
+    with SessionLocal() as db:
+        status_code, body, content_type = checkout_idempotent(db, payload, Idempotency_Key)
+        return Response(content=body, status_code=status_code, media_type=content_type, headers=lsn_headers(db))
+
+@app.post("/payments:batch", response_model=PaymentBatchOut, tags=["payments"])
+def pay_orders(payload: PaymentBatchIn):
     with SessionLocal() as db:
+        results = pay_orders_batch(db, [(item.order_id, item.idempotency_key) for item in payload.items])
+    return {"results": results}
+
+@app.get("/orders", response_model=OrderPage, tags=["orders"])
+def get_orders(
+    user_id: UUID | None = None,
+    status: OrderStatus | None = None,
+    created_after: datetime | None = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    include_ledger: bool = False,
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
+        return list_orders(
+            db, limit=limit, cursor=cursor, user_id=user_id, status=status,
+            created_after=created_after, include_ledger=include_ledger,
+        )
+
+@app.get(
+    "/orders/{order_id}", response_model=OrderDetail, tags=["orders"],
+    dependencies=[Depends(admit("order", READ))],
+)
+def get_order(
+    order_id: UUID, response: Response,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
         order = db.get(Order, order_id)
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
+        etag = order_etag(order.version)
+        if not_modified(if_none_match, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
         return order
 
-@app.get("/orders/{order_id}/ledger", response_model=List[LedgerEntryOut], tags=["ledger"])
-def get_order_ledger(order_id: UUID):
-    with SessionLocal() as db:
+@app.get(
+    "/orders/{order_id}/ledger", response_model=List[LedgerEntryOut], tags=["ledger"],
+    dependencies=[Depends(admit("ledger", READ))],
+)
+def get_order_ledger(
+    order_id: UUID, response: Response,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
         # 404 if order doesn't exist (nicer than returning empty)
-        exists = db.get(Order, order_id)
-        if not exists:
+        version = db.scalar(version_stmt(order_id))
+        if version is None:
             raise HTTPException(status_code=404, detail="Order not found")
-
-        rows = db.execute(
-            select(LedgerEntry).where(LedgerEntry.order_id == order_id)
-        ).scalars().all()
-        return rows
+        etag = order_etag(version)
+        if not_modified(if_none_match, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+        return order_ledger(db, order_id)
     
-@app.get("/orders/{order_id}/ledger/summary", response_model=LedgerSummaryOut, tags=["ledger"])
-def get_order_ledger_summary(order_id: UUID):
-    with SessionLocal() as db:
-        # ensure order exists
-        exists = db.get(Order, order_id)
-        if not exists:
+@app.get(
+    "/orders/{order_id}/ledger/page", response_model=LedgerPage, tags=["ledger"],
+    dependencies=[Depends(admit("ledger_page", READ))],
+)
+def get_order_ledger_page(
+    order_id: UUID,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
+        if not db.get(Order, order_id):
             raise HTTPException(status_code=404, detail="Order not found")
+        return order_ledger_page(db, order_id, limit, cursor)
 
-        totals = db.execute(
-            select(
-                func.coalesce(func.sum(LedgerEntry.debit_cents), 0).label("debits"),
-                func.coalesce(func.sum(LedgerEntry.credit_cents), 0).label("credits"),
-            ).where(LedgerEntry.order_id == order_id)
-        ).one()
-
-        return {
-            "order_id": order_id,
-            "total_debits": int(totals.debits or 0),
-            "total_credits": int(totals.credits or 0),
-        }
+@app.get(
+    "/orders/{order_id}/ledger/summary", response_model=LedgerSummaryOut, tags=["ledger"],
+    dependencies=[Depends(admit("ledger_summary", READ))],
+)
+def get_order_ledger_summary(
+    order_id: UUID, response: Response,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
+        # ensure order exists
+        version = db.scalar(version_stmt(order_id))
+        if version is None:
+            raise HTTPException(status_code=404, detail="Order not found")
+        etag = order_etag(version)
+        if not_modified(if_none_match, etag):
+            return not_modified_response(etag)
+        response.headers["ETag"] = etag
+        return order_ledger_summary(db, order_id)
     
-@app.post("/orders/{order_id}/refund", tags=["orders"])
+@app.post("/orders/{order_id}/refund", tags=["orders"], dependencies=[Depends(admit("refund", WRITE))])
 def refund_order(order_id: UUID, Idempotency_Key: str = Header(alias="Idempotency-Key")):
     if not Idempotency_Key:
         raise HTTPException(status_code=400, detail="Missing Idempotency-Key header")
     with SessionLocal() as db:
-        status_code, body = refund_order_idempotent(db, order_id, Idempotency_Key)
-        return JSONResponse(status_code=status_code, content=body)    
\ No newline at end of file
+        status_code, body, content_type = refund_order_idempotent(db, order_id, Idempotency_Key)
+        return Response(content=body, status_code=status_code, media_type=content_type, headers=lsn_headers(db))
+
+@app.get("/accounts/{account}/balance", response_model=AccountBalanceOut, tags=["ledger"])
+def get_account_balance(
+    account: Literal["CASH", "REVENUE"],
+    currency: str = Query(..., min_length=3, max_length=3),
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
+        return account_balance(db, account, currency.upper())
+
+@app.get("/users/{user_id}/balance", response_model=UserBalanceOut, tags=["ledger"])
+def get_user_balance(
+    user_id: UUID,
+    currency: str = Query(..., min_length=3, max_length=3),
+    pref: ReadPreference = Depends(read_preference),
+):
+    with read_session(pref) as db:
+        return user_balance(db, user_id, currency.upper())
+
+@app.get("/ledger/export", tags=["ledger"])
+def export_ledger(
+    from_: datetime = Query(..., alias="from", description="Inclusive lower bound on created_at"),
+    to: datetime = Query(..., description="Exclusive upper bound on created_at"),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    accept_encoding: str = Header(default="", alias="Accept-Encoding"),
+    pref: ReadPreference = Depends(read_preference),
+):
+    # Naive timestamps are taken as UTC
+    start = from_ if from_.tzinfo else from_.replace(tzinfo=timezone.utc)
+    end = to if to.tzinfo else to.replace(tzinfo=timezone.utc)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+
+    gzip = accepts_gzip(accept_encoding)
+    headers = {
+        "Content-Disposition": f'attachment; filename="ledger-{start:%Y%m%d}-{end:%Y%m%d}.{format}"',
+        # The body depends on Accept-Encoding, so caches must key on it too
+        "Vary": "Accept-Encoding",
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream_ledger(start, end, format, gzip=gzip, bind=read_bind(pref)),
+        media_type=MEDIA_TYPES[format],
+        headers=headers,
+    )
+
+def require_admin(token: str | None) -> None:
+    # Without ADMIN_TOKEN the admin endpoints don't exist as far as callers can tell
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Bytes: compare_digest raises TypeError on non-ASCII str (latin-1 header bytes)
+    if not token or not secrets.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profile", response_class=PlainTextResponse, tags=["admin"])
+async def admin_profile(
+    seconds: float = Query(10.0, gt=0, le=MAX_SECONDS),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    x_admin_token: str | None = Header(None, alias="X-Admin-Token"),
+):
+    """Sample this worker's stacks for `seconds`; returns folded stacks for flamegraph.pl / speedscope."""
+    require_admin(x_admin_token)
+    try:
+        counts = await asyncio.to_thread(sample, seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return PlainTextResponse(folded(counts))
@@ -1,5 +1,19 @@
 # app/metrics.py
-from prometheus_client import Counter, Histogram, make_asgi_app
+"""
+Prometheus metrics.
+
+With several worker processes (uvicorn --workers N, gunicorn), set
+PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before the app starts:
+every worker then writes its samples to mmap-backed files there and /metrics
+aggregates all workers, whichever one serves the scrape. Gauges declare how they
+combine across processes (multiprocess_mode); set_function gauges and custom
+collectors are not available in that mode.
+"""
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app, multiprocess
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
 
 # Counters
 payments_total = Counter("payments_total", "Successful payment operations")
@@ -10,6 +24,21 @@ idempotency_hits = Counter(
     "Idempotency cache hits (same key, same request)",
     ["endpoint"],
 )
+idempotency_cache_hits = Counter(
+    "idempotency_cache_hits_total",
+    "Completed responses served from the in-process cache (no DB lookup)",
+    ["endpoint"],
+)
+idempotency_cache_misses = Counter(
+    "idempotency_cache_misses_total",
+    "In-process cache misses (fell through to the DB)",
+    ["endpoint"],
+)
+idempotency_cache_evictions = Counter(
+    "idempotency_cache_evictions_total",
+    "Entries dropped from the in-process cache",
+    ["reason"],  # 'ttl' or 'size'
+)
 idempotency_conflicts = Counter(
     "idempotency_conflicts_total",
     "Key reused for different request (409)",
@@ -21,12 +50,147 @@ inflight_retries = Counter(
     ["endpoint"],
 )
 
+inflight_waiters = Gauge(
+    "idempotency_inflight_waiters",
+    "Duplicate requests currently waiting for the in-flight owner to finish",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+inflight_wait_seconds = Histogram(
+    "idempotency_inflight_wait_seconds",
+    "Time duplicates spent waiting for the in-flight owner",
+    ["endpoint", "outcome"],  # 'done' (owner finished) or 'timeout' (fell back to 425)
+)
+
+idempotency_keys_swept = Counter(
+    "idempotency_keys_swept_total",
+    "Expired idempotency keys deleted by the retention sweeper",
+)
+
 payment_errors = Counter("payment_errors_total", "Payment errors", ["type"])
 refund_errors = Counter("refund_errors_total", "Refund errors", ["type"])
 
 # Latency
 payment_latency = Histogram("payment_latency_seconds", "Payment latency in seconds")
 refund_latency = Histogram("refund_latency_seconds", "Refund latency in seconds")
+checkout_latency = Histogram("checkout_latency_seconds", "Create-and-pay (POST /checkout) latency in seconds")
+payment_phase_latency = Histogram(
+    "payment_phase_seconds",
+    "Time per phase of the idempotent write path (see app/phases.py)",
+    ["endpoint", "phase"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+payment_batch_latency = Histogram("payment_batch_latency_seconds", "Batch payment latency in seconds (whole batch)")
+
+# Group commit
+group_commit_batch_size = Histogram(
+    "group_commit_batch_size",
+    "Operations committed together in one group-commit transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+group_commit_queue_delay = Histogram(
+    "group_commit_queue_delay_seconds",
+    "Time an operation waited in the group-commit queue before its batch started",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+group_commit_failures = Counter(
+    "group_commit_failures_total",
+    "Group-commit transactions that failed as a whole (every caller in the batch gets the error)",
+)
+
+# Database
+replica_routing = Counter(
+    "db_read_routing_total",
+    "Where read requests were served",
+    ["target", "reason"],  # target: 'replica' or 'primary'; reason: default, read_your_writes, lag, no_replica
+)
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection (includes opening a new one)",
+    ["pool"],  # 'sync' or 'async'
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Pooled connections by state",
+    ["pool", "state"],  # state: 'in_use' or 'idle'
+    multiprocess_mode="livesum",
+)
+db_statement_latency = Histogram(
+    "db_statement_seconds",
+    "Statement execution time (driver round trip)",
+    ["kind", "endpoint"],  # kind: SELECT/INSERT/UPDATE/DELETE/OTHER; endpoint: route path
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+db_slow_queries = Counter("db_slow_queries_total", "Statements slower than DB_SLOW_QUERY_MS", ["kind", "endpoint"])
+
+# HTTP (recorded by app.middleware.RequestMetricsMiddleware)
+http_requests = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status",
+    ["method", "route", "status"],
+)
+http_request_latency = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template (until the response is fully sent)",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Admission control (app/admission.py)
+admission_shed = Counter(
+    "admission_shed_total",
+    "Requests answered 503 by admission control",
+    ["endpoint", "reason"],  # reason: 'queue_full' or 'timeout'
+)
+admission_queue_wait = Histogram(
+    "admission_queue_wait_seconds",
+    "Time spent waiting for an admission slot",
+    ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+admission_queue_depth = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ["priority"],
+    multiprocess_mode="livesum",
+)
+admission_in_flight = Gauge(
+    "admission_in_flight",
+    "Admitted requests currently running",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+# Ledger reconciliation (python -m app.cli reconcile); "mostrecent" so the last run
+# wins when the job shares PROMETHEUS_MULTIPROC_DIR with the app
+reconciliation_duration = Gauge(
+    "reconciliation_last_run_seconds",
+    "Duration of the last ledger reconciliation run",
+    multiprocess_mode="mostrecent",
+)
+reconciliation_discrepancies = Gauge(
+    "reconciliation_discrepancies",
+    "Discrepancies found by the last ledger reconciliation run",
+    ["check"],
+    multiprocess_mode="mostrecent",
+)
+
+
+def _metrics_app():
+    if not MULTIPROCESS:
+        return make_asgi_app()
+    # Separate registry that aggregates every worker's files instead of this process's samples
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry=registry)
+
+
+def mark_worker_dead(pid: int) -> None:
+    """Drop a finished worker's live gauges (multiprocess mode only)."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
 
 # ASGI app for /metrics
-metrics_asgi_app = make_asgi_app()
+metrics_asgi_app = _metrics_app()
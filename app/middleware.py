@@ -0,0 +1,39 @@
+# app/middleware.py
+from time import perf_counter
+
+from app.metrics import http_requests, http_request_latency
+
+
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task/stream wrapping): counts
+    requests and times them by method, route template and status. The template
+    (/orders/{order_id}) keeps label cardinality bounded; requests that match no
+    route are labelled "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = perf_counter()
+        status = 500  # if the app raises before starting a response
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route on this same scope dict
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_requests.labels(scope["method"], template, str(status)).inc()
+            http_request_latency.labels(scope["method"], template).observe(perf_counter() - start)
@@ -0,0 +1,247 @@
+# app/migrations.py
+"""
+Versioned schema migrations.
+
+Each migration runs once, in its own transaction, and is recorded in
+`schema_migrations`. A session-level advisory lock makes concurrent runners
+(several workers booting at once) wait for each other instead of racing.
+
+    python -m app.cli migrate
+
+The baseline (version 1) is NOT frozen: it runs Base.metadata.create_all, so it
+builds whatever the models are when it runs. On a fresh database that already
+includes every table, column and model-level index that later migrations add
+(version 6 creates the journal tables, 7 adds orders.version). Version 1 also
+creates the balance tables, which have no migration of their own. Every later
+migration therefore has to be idempotent against the current models:
+IF NOT EXISTS / create_all(tables=...) for new objects, and a check of the
+actual schema before a rewrite (as _partition_ledger does). Because the models
+change what version 1 does, never write a migration that assumes version 1
+produced a particular older shape.
+"""
+import logging
+from datetime import date, datetime, timezone
+from typing import Callable, List, NamedTuple, Union
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.config import settings
+from app.models import Account, Base, JournalTransaction, LEDGER_LINES_VIEW, Posting
+from app.services.balances import recompute_balances
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=text("now()")),
+)
+
+log = logging.getLogger(__name__)
+
+_LOCK_ID = 0x6D696E74  # 'mint'
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Union[List[str], Callable[[Connection], None]]
+
+
+# --- ledger_entries partitioning ---------------------------------------------------
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def is_ledger_partitioned(conn: Connection) -> bool:
+    kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = 'ledger_entries'::regclass")).scalar()
+    return kind == "p"
+
+
+def _create_month_partition(conn: Connection, month: date) -> None:
+    """
+    Create one month's partition. Rows for that month already sitting in the DEFAULT
+    partition would make the CREATE fail, so in that case the default partition is
+    detached, the new partition created, the rows moved over and the default
+    reattached (briefly locks the ledger; only happens after a clock skew / gap).
+    """
+    name = f"ledger_entries_y{month:%Y}m{month:%m}"
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return
+    lo, hi = f"{month.isoformat()} 00:00:00+00", f"{_next_month(month).isoformat()} 00:00:00+00"
+    create = text(f"CREATE TABLE {name} PARTITION OF ledger_entries FOR VALUES FROM ('{lo}') TO ('{hi}')")
+
+    in_month = "created_at >= CAST(:lo AS timestamptz) AND created_at < CAST(:hi AS timestamptz)"
+    bounds = {"lo": lo, "hi": hi}
+    has_default = conn.execute(text("SELECT to_regclass('ledger_entries_default')")).scalar() is not None
+    stray = has_default and conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM ledger_entries_default WHERE {in_month})"
+    ), bounds).scalar()
+    if not stray:
+        conn.execute(create)
+        return
+
+    conn.execute(text("ALTER TABLE ledger_entries DETACH PARTITION ledger_entries_default"))
+    conn.execute(create)
+    conn.execute(text(f"INSERT INTO ledger_entries SELECT * FROM ledger_entries_default WHERE {in_month}"), bounds)
+    conn.execute(text(f"DELETE FROM ledger_entries_default WHERE {in_month}"), bounds)
+    conn.execute(text("ALTER TABLE ledger_entries ATTACH PARTITION ledger_entries_default DEFAULT"))
+
+
+def ensure_ledger_partitions(conn: Connection, months_ahead: int) -> List[str]:
+    """Create the current month's partition plus `months_ahead` future ones (no-op if unpartitioned)."""
+    if not is_ledger_partitioned(conn):
+        return []
+    month = _month_start(datetime.now(timezone.utc).date())
+    created = []
+    for _ in range(months_ahead + 1):
+        _create_month_partition(conn, month)
+        created.append(f"ledger_entries_y{month:%Y}m{month:%m}")
+        month = _next_month(month)
+    return created
+
+
+def _partition_ledger(conn: Connection) -> None:
+    """
+    Rebuild ledger_entries as a RANGE(created_at) partitioned table with monthly
+    partitions and copy the rows over. Takes an exclusive lock on the ledger for the
+    duration of the copy, so run it in a maintenance window on large tables.
+    """
+    if is_ledger_partitioned(conn):
+        return
+
+    conn.execute(text("LOCK TABLE ledger_entries IN ACCESS EXCLUSIVE MODE"))
+    # Depends on the old table; recreated by the journal migration
+    conn.execute(text("DROP VIEW IF EXISTS ledger_lines"))
+    conn.execute(text("ALTER TABLE ledger_entries RENAME TO ledger_entries_unpartitioned"))
+    conn.execute(text(
+        "ALTER TABLE ledger_entries_unpartitioned "
+        "RENAME CONSTRAINT ledger_entries_pkey TO ledger_entries_unpartitioned_pkey"
+    ))
+    # Free the index names for the new parent table
+    conn.execute(text("DROP INDEX IF EXISTS ix_ledger_entries_order_id, ix_ledger_entries_created_at_brin"))
+
+    conn.execute(text(
+        "CREATE TABLE ledger_entries ("
+        " LIKE ledger_entries_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS"
+        ") PARTITION BY RANGE (created_at)"
+    ))
+    # The partition key has to be part of the primary key
+    conn.execute(text("ALTER TABLE ledger_entries ADD CONSTRAINT ledger_entries_pkey PRIMARY KEY (id, created_at)"))
+    conn.execute(text(
+        "ALTER TABLE ledger_entries ADD CONSTRAINT ledger_entries_order_id_fkey "
+        "FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE"
+    ))
+    conn.execute(text("CREATE INDEX ix_ledger_entries_order_id ON ledger_entries (order_id)"))
+    conn.execute(text("CREATE INDEX ix_ledger_entries_created_at_brin ON ledger_entries USING brin (created_at)"))
+
+    # One partition per month that already has rows, then the months ahead
+    oldest = conn.execute(text("SELECT min(created_at) FROM ledger_entries_unpartitioned")).scalar()
+    month = _month_start((oldest or datetime.now(timezone.utc)).astimezone(timezone.utc).date())
+    current = _month_start(datetime.now(timezone.utc).date())
+    while month < current:
+        _create_month_partition(conn, month)
+        month = _next_month(month)
+    ensure_ledger_partitions(conn, settings.ledger_partitions_ahead)
+    # Safety net for rows outside every range (e.g. clock skew); should stay empty.
+    # _create_month_partition moves any such rows out when their month is created.
+    conn.execute(text("CREATE TABLE ledger_entries_default PARTITION OF ledger_entries DEFAULT"))
+
+    conn.execute(text("INSERT INTO ledger_entries SELECT * FROM ledger_entries_unpartitioned"))
+    conn.execute(text("DROP TABLE ledger_entries_unpartitioned"))
+
+
+def _journal_ledger(conn: Connection) -> None:
+    """accounts / journal_transactions / postings plus the ledger_lines compatibility view."""
+    Base.metadata.create_all(
+        bind=conn, tables=[Account.__table__, JournalTransaction.__table__, Posting.__table__],
+    )
+    conn.execute(text(LEDGER_LINES_VIEW))
+
+
+MIGRATIONS: List[Migration] = [
+    # Current models, not a frozen snapshot: see the module docstring
+    Migration(1, "baseline schema", lambda conn: Base.metadata.create_all(bind=conn)),
+    Migration(2, "hot-path indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_ledger_entries_order_id ON ledger_entries (order_id)",
+        "CREATE INDEX IF NOT EXISTS ix_orders_user_id_created_at ON orders (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_idempotency_keys_created_at ON idempotency_keys (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ledger_entries_created_at_brin ON ledger_entries USING brin (created_at)",
+    ]),
+    Migration(3, "monthly range partitions for ledger_entries", _partition_ledger),
+    Migration(4, "keyset pagination indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_ledger_entries_order_id_created_at_id "
+        "ON ledger_entries (order_id, created_at, id)",
+        # Covered by the composite index above
+        "DROP INDEX IF EXISTS ix_ledger_entries_order_id",
+    ]),
+    Migration(5, "store idempotent responses as bytes", [
+        "ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS response_bytes bytea",
+        "ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS content_type varchar",
+    ]),
+    Migration(6, "journal / postings ledger and ledger_lines view", _journal_ledger),
+    Migration(7, "order version for ETags", [
+        # Constant default: no table rewrite
+        "ALTER TABLE orders ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+    ]),
+    # The balance tables only see ledger writes made after they were added; fill in
+    # everything older so summaries and balances are right straight after upgrade
+    Migration(8, "backfill balance tables from the ledger", recompute_balances),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    if conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+        return 0
+    return conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations")).scalar_one()
+
+
+def verify_schema(engine: Engine) -> int:
+    """Boot check for STARTUP_MODE=verify: one query, no DDL, no locks."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"database schema is at version {version}, this build expects {SCHEMA_VERSION}; "
+            f"run `python -m app.cli migrate`"
+        )
+    if version > SCHEMA_VERSION:
+        # A newer build already migrated (rolling deploy or rollback); migrations are
+        # additive, so this one keeps serving
+        log.warning("database schema is at version %d, ahead of this build's %d", version, SCHEMA_VERSION)
+    return version
+
+
+def migrate(engine: Engine) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    applied = []
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _LOCK_ID})
+        conn.commit()
+        try:
+            with conn.begin():
+                _meta.create_all(bind=conn)
+            for m in MIGRATIONS:
+                with conn.begin():
+                    if m.version <= current_version(conn):
+                        continue
+                    if callable(m.apply):
+                        m.apply(conn)
+                    else:
+                        for sql in m.apply:
+                            conn.execute(text(sql))
+                    conn.execute(schema_migrations.insert().values(version=m.version, description=m.description))
+                applied.append(m.version)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _LOCK_ID})
+            conn.commit()
+    return applied
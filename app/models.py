@@ -4,8 +4,8 @@ import enum
 from uuid import uuid4
 
 from sqlalchemy import (
-    CheckConstraint, Column, DateTime, Enum, ForeignKey, Integer,
-    String, CHAR, JSON, UniqueConstraint, text
+    DDL, BigInteger, CheckConstraint, Column, DateTime, Enum, ForeignKey, Identity, Index, Integer,
+    LargeBinary, MetaData, SmallInteger, String, Table, CHAR, JSON, UniqueConstraint, event, text
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
@@ -27,14 +27,21 @@ class Order(Base):
     amount_cents = Column(Integer, nullable=False)
     currency = Column(CHAR(3), nullable=False)
     status = Column(Enum(OrderStatus), nullable=False, default=OrderStatus.PENDING)
+    # Bumped with updated_at whenever the order or its ledger changes (ETag, see app/etag.py)
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
     updated_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
 
     __table_args__ = (
         CheckConstraint("amount_cents > 0", name="orders_amount_positive"),
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_created_at_id", "created_at", "id"),  # keyset pagination
     )
 
-    ledger_entries = relationship("LedgerEntry", back_populates="order")
+    # Reads go through the ledger_lines view, so both ledger models show up
+    ledger_entries = relationship(
+        "LedgerLine", primaryjoin="foreign(LedgerLine.order_id) == Order.id", viewonly=True,
+    )
 
 class LedgerEntry(Base):
     __tablename__ = "ledger_entries"
@@ -46,24 +53,139 @@ class LedgerEntry(Base):
     credit_cents = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
 
-    order = relationship("Order", back_populates="ledger_entries")
+    order = relationship("Order")
 
     __table_args__ = (
         CheckConstraint("debit_cents >= 0 AND credit_cents >= 0", name="ledger_nonneg"),
         CheckConstraint("(debit_cents = 0) <> (credit_cents = 0)", name="ledger_exactly_one_side"),
         CheckConstraint("account IN ('CASH','REVENUE')", name="ledger_account_valid"),
+        # Serves order_id lookups and keyset pages within an order
+        Index("ix_ledger_entries_order_id_created_at_id", "order_id", "created_at", "id"),
+        # BRIN: tiny index that fits append-only, time-ordered rows (one per partition)
+        Index("ix_ledger_entries_created_at_brin", "created_at", postgresql_using="brin"),
+    )
+
+# --- Compact ledger (LEDGER_MODEL=journal): one journal transaction per payment /
+# refund, BIGINT identity keys (append-only btree) and SMALLINT account ids ---
+
+ACCOUNT_IDS = {"CASH": 1, "REVENUE": 2}
+
+class Account(Base):
+    __tablename__ = "accounts"
+
+    id = Column(SmallInteger, primary_key=True, autoincrement=False)
+    code = Column(String, nullable=False, unique=True)
+
+event.listen(Account.__table__, "after_create", DDL(
+    "INSERT INTO accounts (id, code) VALUES "
+    + ", ".join(f"({i}, '{code}')" for code, i in ACCOUNT_IDS.items())
+    + " ON CONFLICT DO NOTHING"
+))
+
+class JournalTransaction(Base):
+    __tablename__ = "journal_transactions"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
+
+    __table_args__ = (
+        Index("ix_journal_transactions_order_id_created_at_id", "order_id", "created_at", "id"),
+        Index("ix_journal_transactions_created_at_brin", "created_at", postgresql_using="brin"),
+    )
+
+class Posting(Base):
+    __tablename__ = "postings"
+
+    # Widest columns first: no alignment padding between them
+    journal_id = Column(BigInteger, ForeignKey("journal_transactions.id", ondelete="CASCADE"), primary_key=True)
+    debit_cents = Column(Integer, nullable=False, default=0)
+    credit_cents = Column(Integer, nullable=False, default=0)
+    account_id = Column(SmallInteger, ForeignKey("accounts.id"), primary_key=True)
+
+    __table_args__ = (
+        CheckConstraint("debit_cents >= 0 AND credit_cents >= 0", name="postings_nonneg"),
+        CheckConstraint("(debit_cents = 0) <> (credit_cents = 0)", name="postings_exactly_one_side"),
     )
 
+# Compatibility view in the old ledger_entries shape over both models; every ledger
+# read goes through it. Postings get a stable uuid built from (journal id, account id).
+LEDGER_LINES_VIEW = """
+CREATE OR REPLACE VIEW ledger_lines AS
+SELECT id, order_id, account, debit_cents, credit_cents, created_at
+FROM ledger_entries
+UNION ALL
+SELECT CAST(lpad(to_hex(j.id), 28, '0') || lpad(to_hex(CAST(p.account_id AS integer)), 4, '0') AS uuid),
+       j.order_id, a.code, p.debit_cents, p.credit_cents, j.created_at
+FROM postings p
+JOIN journal_transactions j ON j.id = p.journal_id
+JOIN accounts a ON a.id = p.account_id
+"""
+
+event.listen(Base.metadata, "after_create", DDL(LEDGER_LINES_VIEW))
+
+class LedgerLine(Base):
+    """Read-only mapping of the ledger_lines view (kept out of Base.metadata: not a table)."""
+    __table__ = Table(
+        "ledger_lines", MetaData(),
+        Column("id", UUID(as_uuid=True), primary_key=True),
+        Column("order_id", UUID(as_uuid=True), nullable=False),
+        Column("account", String, nullable=False),
+        Column("debit_cents", Integer, nullable=False),
+        Column("credit_cents", Integer, nullable=False),
+        Column("created_at", DateTime(timezone=True), nullable=False),
+    )
+
+# --- Balances: running totals maintained in the same transaction as the ledger rows ---
+
+class OrderBalance(Base):
+    """Per (order, account) totals; the ledger summary reads these instead of SUM()."""
+    __tablename__ = "order_balances"
+
+    order_id = Column(UUID(as_uuid=True), ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True)
+    account = Column(String, primary_key=True)
+    debit_cents = Column(BigInteger, nullable=False, server_default=text("0"))
+    credit_cents = Column(BigInteger, nullable=False, server_default=text("0"))
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
+
+class AccountBalance(Base):
+    """
+    Per (account, currency) rollup, striped over `shard` rows so concurrent payments
+    don't all queue on one hot row. Readers sum the (few) shards.
+    """
+    __tablename__ = "account_balances"
+
+    account = Column(String, primary_key=True)
+    currency = Column(CHAR(3), primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    debit_cents = Column(BigInteger, nullable=False, server_default=text("0"))
+    credit_cents = Column(BigInteger, nullable=False, server_default=text("0"))
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
+
+class UserBalance(Base):
+    """Per (user, currency) cash movements: what the user paid and got back."""
+    __tablename__ = "user_balances"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    currency = Column(CHAR(3), primary_key=True)
+    paid_cents = Column(BigInteger, nullable=False, server_default=text("0"))
+    refunded_cents = Column(BigInteger, nullable=False, server_default=text("0"))
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
+
 class IdempotencyKey(Base):
     __tablename__ = "idempotency_keys"
 
     key = Column(String, primary_key=True)
     request_fingerprint = Column(String, nullable=True)
     status_code = Column(Integer, nullable=True)
-    response_body = Column(JSON, nullable=True)
+    response_body = Column(JSON, nullable=True)  # legacy rows; new rows store response_bytes
+    # Exact bytes sent the first time, replayed verbatim
+    response_bytes = Column(LargeBinary, nullable=True)
+    content_type = Column(String, nullable=True)
     locked_until = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), nullable=False, server_default=text("now()"))
 
     __table_args__ = (
         UniqueConstraint("key", name="idemp_key_unique"),
+        Index("ix_idempotency_keys_created_at", "created_at"),
     )
@@ -0,0 +1,63 @@
+# app/phases.py
+"""
+Phase timing for the idempotent write path (pay / refund / checkout).
+
+Each phase is observed in payment_phase_seconds{endpoint, phase}:
+
+    cache_lookup    in-process response cache
+    claim           claim / replay-check the idempotency key (incl. waiting on its lock)
+    lock_order      SELECT ... FOR UPDATE on the order (time spent behind a hot order)
+    ledger_write    ledger rows, balance upserts, order status / version
+    store_response  write the response under the key
+    commit          the transaction's COMMIT
+    group_commit    queue + shared commit, when GROUP_COMMIT_ENABLED
+
+With TRACING_ENABLED=true every phase is also an OpenTelemetry span (child of the
+operation's span, and of the request's span if an instrumentation creates one).
+Only opentelemetry-api is needed here; without an SDK configured the spans are
+no-ops. Spans aren't created at all when tracing is off.
+"""
+import logging
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Iterator, Optional
+
+from app.config import settings
+from app.metrics import payment_phase_latency
+
+log = logging.getLogger(__name__)
+
+_tracer = None
+_tracer_loaded = False
+
+
+def _get_tracer():
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer_loaded = True
+        if settings.tracing_enabled:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                log.warning("TRACING_ENABLED is set but opentelemetry-api is not installed; no spans")
+            else:
+                _tracer = trace.get_tracer("mintguard")
+    return _tracer
+
+
+def span(name: str, endpoint: Optional[str] = None):
+    """A trace span when tracing is on, otherwise a no-op context."""
+    tracer = _get_tracer()
+    if tracer is None:
+        return nullcontext()
+    return tracer.start_as_current_span(name, attributes={"mintguard.endpoint": endpoint or name})
+
+
+@contextmanager
+def phase(endpoint: str, name: str) -> Iterator[None]:
+    start = perf_counter()
+    try:
+        with span(f"{endpoint}.{name}", endpoint):
+            yield
+    finally:
+        payment_phase_latency.labels(endpoint, name).observe(perf_counter() - start)
@@ -0,0 +1,65 @@
+# app/profiler.py
+"""
+On-demand sampling profiler (POST /admin/profile).
+
+A background thread snapshots every thread's Python stack with
+sys._current_frames() at a fixed interval and counts identical stacks. The
+output is the "folded" format (one `frame;frame;frame count` line per stack,
+root first) read by flamegraph.pl, speedscope and inferno. Sampling costs the
+serving threads nothing beyond the GIL hand-offs, so it is safe on a live
+worker; only one profile runs at a time per process.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from time import monotonic, sleep
+from types import FrameType
+from typing import Dict, Optional
+
+MAX_SECONDS = 60.0
+
+_running = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    path = os.path.relpath(code.co_filename) if not code.co_filename.startswith("<") else code.co_filename
+    if path.startswith(".."):  # outside the app: site-packages / stdlib, keep it short
+        path = os.path.basename(code.co_filename)
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+def _stack(frame: Optional[FrameType]) -> str:
+    frames = []
+    while frame is not None:
+        frames.append(_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def sample(seconds: float, interval: float) -> Dict[str, int]:
+    """Folded stack -> sample count for every thread but this one, for `seconds`."""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        deadline = monotonic() + min(seconds, MAX_SECONDS)
+        while monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    counts[f"{names.get(ident, ident)};{_stack(frame)}"] += 1
+            sleep(interval)
+        return dict(counts)
+    finally:
+        _running.release()
+
+
+def folded(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
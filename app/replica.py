@@ -0,0 +1,107 @@
+# app/replica.py
+"""
+Read-replica routing for GET endpoints.
+
+With READ_DATABASE_URL set, reads go to the replica unless the request asks for
+data the replica may not have yet:
+
+    X-Read-Your-Writes: true   -> served by the primary
+    X-Min-LSN: 0/16B3748       -> replica only if it has replayed up to that LSN,
+                                  otherwise the primary
+
+Write endpoints return the primary's WAL position in X-LSN, so a client can pass
+it back as X-Min-LSN and read its own writes without pinning every read to the
+primary. Without a replica everything reads from the primary, as before.
+"""
+import re
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Header, HTTPException
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, ReadSessionLocal, engine, read_engine
+from app.metrics import replica_routing
+
+LSN_HEADER = "X-LSN"
+_LSN_RE = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+# A standby reports how far it has replayed; a server that isn't in recovery (e.g. a
+# second local Postgres standing in for a replica) reports its own WAL position.
+_REPLAYED_SQL = text(
+    "SELECT coalesce(pg_last_wal_replay_lsn(), pg_current_wal_lsn()) >= CAST(:lsn AS pg_lsn)"
+)
+
+
+class ReadPreference(NamedTuple):
+    min_lsn: Optional[str]
+    read_your_writes: bool
+
+
+def read_preference(
+    min_lsn: Optional[str] = Header(None, alias="X-Min-LSN"),
+    read_your_writes: bool = Header(False, alias="X-Read-Your-Writes"),
+) -> ReadPreference:
+    """FastAPI dependency: the request's consistency headers."""
+    if min_lsn is not None and not _LSN_RE.match(min_lsn):
+        raise HTTPException(status_code=400, detail="Invalid X-Min-LSN")
+    return ReadPreference(min_lsn, read_your_writes)
+
+
+def _routed(replica: bool, reason: str) -> bool:
+    replica_routing.labels("replica" if replica else "primary", reason).inc()
+    return replica
+
+
+def use_replica(pref: ReadPreference) -> bool:
+    if read_engine is engine:
+        return _routed(False, "no_replica")
+    if pref.read_your_writes:
+        return _routed(False, "read_your_writes")
+    if pref.min_lsn:
+        with read_engine.connect() as conn:
+            if not conn.execute(_REPLAYED_SQL, {"lsn": pref.min_lsn}).scalar():
+                return _routed(False, "lag")
+    return _routed(True, "default")
+
+
+def read_session(pref: ReadPreference) -> Session:
+    """Session on the replica or the primary, per `pref`."""
+    return ReadSessionLocal() if use_replica(pref) else SessionLocal()
+
+
+def read_bind(pref: ReadPreference) -> Engine:
+    return read_engine if use_replica(pref) else engine
+
+
+async def async_read_session(pref: ReadPreference):
+    """Async counterpart of read_session (ASYNC_DB=true)."""
+    from app.db_async import AsyncReadSessionLocal, AsyncSessionLocal, async_engine, async_read_engine
+
+    if async_read_engine is async_engine:
+        replica = _routed(False, "no_replica")
+    elif pref.read_your_writes:
+        replica = _routed(False, "read_your_writes")
+    elif pref.min_lsn:
+        async with async_read_engine.connect() as conn:
+            caught_up = (await conn.execute(_REPLAYED_SQL, {"lsn": pref.min_lsn})).scalar()
+        replica = _routed(bool(caught_up), "default" if caught_up else "lag")
+    else:
+        replica = _routed(True, "default")
+    return AsyncReadSessionLocal() if replica else AsyncSessionLocal()
+
+
+def lsn_headers(db: Session) -> Dict[str, str]:
+    """{X-LSN: primary WAL position} for write responses; empty when there is no replica."""
+    if read_engine is engine:
+        return {}
+    return {LSN_HEADER: db.scalar(text("SELECT pg_current_wal_lsn()::text"))}
+
+
+async def lsn_headers_async(db) -> Dict[str, str]:
+    from app.db_async import async_engine, async_read_engine
+
+    if async_read_engine is async_engine:
+        return {}
+    return {LSN_HEADER: (await db.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()}
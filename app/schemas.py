@@ -2,7 +2,11 @@ from enum import Enum
 from uuid import UUID
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Literal
+from typing import Any, Dict, List, Literal
+
+# Upper bound on items accepted by the batch endpoints
+MAX_BATCH_ITEMS = 5000
+
 class OrderStatus(str, Enum):
     PENDING = "PENDING"
     PAID = "PAID"
@@ -19,6 +23,36 @@ class OrderOut(BaseModel):
     amount_cents: int
     currency: str
     status: OrderStatus
+
+class OrderBatchCreate(BaseModel):
+    # Items are validated one by one so a bad row doesn't reject the whole batch
+    orders: List[Any] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class OrderBatchItemOut(BaseModel):
+    index: int
+    order: OrderOut | None = None
+    errors: List[Dict[str, Any]] | None = None
+
+class OrderBatchOut(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderBatchItemOut]
+class PaymentBatchItem(BaseModel):
+    order_id: UUID
+    idempotency_key: str = Field(..., min_length=1, description="Same role as the Idempotency-Key header")
+
+class PaymentBatchIn(BaseModel):
+    items: List[PaymentBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+class PaymentBatchItemOut(BaseModel):
+    order_id: UUID
+    idempotency_key: str
+    status_code: int
+    body: Dict[str, Any]
+
+class PaymentBatchOut(BaseModel):
+    results: List[PaymentBatchItemOut]
+
 class OrderDetail(OrderOut):
     created_at: datetime | None = None
     updated_at: datetime | None = None
@@ -30,7 +64,33 @@ class LedgerEntryOut(BaseModel):
     debit_cents: int
     credit_cents: int
     
+class OrderListItem(OrderDetail):
+    # Only present when the listing was asked to include_ledger
+    ledger_entries: List[LedgerEntryOut] | None = None
+
+class OrderPage(BaseModel):
+    items: List[OrderListItem]
+    next_cursor: str | None = None
+
+class LedgerPage(BaseModel):
+    items: List[LedgerEntryOut]
+    next_cursor: str | None = None
+
 class LedgerSummaryOut(BaseModel):
     order_id: UUID
     total_debits: int
     total_credits: int
+
+class AccountBalanceOut(BaseModel):
+    account: Literal["CASH", "REVENUE"]
+    currency: str
+    total_debits: int
+    total_credits: int
+    balance_cents: int  # on the account's normal side (CASH: DR - CR, REVENUE: CR - DR)
+
+class UserBalanceOut(BaseModel):
+    user_id: UUID
+    currency: str
+    paid_cents: int
+    refunded_cents: int
+    net_cents: int
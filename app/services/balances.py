@@ -0,0 +1,132 @@
+# app/services/balances.py
+from collections import defaultdict
+from typing import Dict, Iterable, Mapping, Tuple, Union
+from uuid import UUID
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import OrderBalance, AccountBalance, UserBalance
+
+
+def _upsert(db: Session, model, keys: Tuple[str, ...], rows: Dict[tuple, Dict[str, int]]) -> None:
+    """One multi-row INSERT ... ON CONFLICT DO UPDATE adding the deltas onto the totals."""
+    if not rows:
+        return
+    # Sorted so concurrent transactions lock rollup rows in the same order (no deadlocks)
+    values = [dict(zip(keys, k), **deltas) for k, deltas in sorted(rows.items(), key=lambda kv: str(kv[0]))]
+    stmt = pg_insert(model).values(values)
+    amounts = [c for c in values[0] if c not in keys]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            **{c: getattr(model, c) + getattr(stmt.excluded, c) for c in amounts},
+            "updated_at": func.now(),
+        },
+    )
+    db.execute(stmt)
+
+
+def apply_ledger_rows(db: Session, rows: Iterable[Mapping], owners: Mapping[UUID, Tuple[UUID, str]]) -> None:
+    """
+    Fold new ledger rows into the balance tables, in the caller's transaction.
+      rows:   dicts with order_id, account, debit_cents, credit_cents (same as LedgerEntry)
+      owners: order_id -> (user_id, currency)
+    """
+    per_order: Dict[tuple, Dict[str, int]] = defaultdict(lambda: {"debit_cents": 0, "credit_cents": 0})
+    per_account: Dict[tuple, Dict[str, int]] = defaultdict(lambda: {"debit_cents": 0, "credit_cents": 0})
+    per_user: Dict[tuple, Dict[str, int]] = defaultdict(lambda: {"paid_cents": 0, "refunded_cents": 0})
+    shards = max(settings.balance_shards, 1)
+
+    for r in rows:
+        user_id, currency = owners[r["order_id"]]
+        for bucket in (per_order[(r["order_id"], r["account"])],
+                       per_account[(r["account"], currency, r["order_id"].int % shards)]):
+            bucket["debit_cents"] += r["debit_cents"]
+            bucket["credit_cents"] += r["credit_cents"]
+        if r["account"] == "CASH":
+            per_user[(user_id, currency)]["paid_cents"] += r["debit_cents"]
+            per_user[(user_id, currency)]["refunded_cents"] += r["credit_cents"]
+
+    _upsert(db, OrderBalance, ("order_id", "account"), per_order)
+    _upsert(db, AccountBalance, ("account", "currency", "shard"), per_account)
+    _upsert(db, UserBalance, ("user_id", "currency"), per_user)
+
+
+def account_balance_stmt(account: str, currency: str):
+    return select(
+        func.coalesce(func.sum(AccountBalance.debit_cents), 0).label("debits"),
+        func.coalesce(func.sum(AccountBalance.credit_cents), 0).label("credits"),
+    ).where(AccountBalance.account == account, AccountBalance.currency == currency)
+
+
+def account_balance(db: Session, account: str, currency: str) -> Dict:
+    totals = db.execute(account_balance_stmt(account, currency)).one()
+    debits, credits = int(totals.debits), int(totals.credits)
+    return {
+        "account": account,
+        "currency": currency,
+        "total_debits": debits,
+        "total_credits": credits,
+        # CASH is debit-normal, REVENUE is credit-normal
+        "balance_cents": debits - credits if account == "CASH" else credits - debits,
+    }
+
+
+def user_balance(db: Session, user_id: UUID, currency: str) -> Dict:
+    row = db.get(UserBalance, (user_id, currency))
+    paid = int(row.paid_cents) if row else 0
+    refunded = int(row.refunded_cents) if row else 0
+    return {
+        "user_id": user_id,
+        "currency": currency,
+        "paid_cents": paid,
+        "refunded_cents": refunded,
+        "net_cents": paid - refunded,
+    }
+
+
+_REBUILD_SQL = [
+    # block new ledger writes (either model) while we recompute
+    "LOCK TABLE ledger_entries, journal_transactions, postings IN SHARE MODE",
+    "TRUNCATE order_balances, account_balances, user_balances",
+    """
+    INSERT INTO order_balances (order_id, account, debit_cents, credit_cents)
+    SELECT order_id, account, sum(debit_cents), sum(credit_cents)
+    FROM ledger_lines
+    GROUP BY order_id, account
+    """,
+    """
+    INSERT INTO account_balances (account, currency, shard, debit_cents, credit_cents)
+    SELECT l.account, o.currency, 0, sum(l.debit_cents), sum(l.credit_cents)
+    FROM ledger_lines l JOIN orders o ON o.id = l.order_id
+    GROUP BY l.account, o.currency
+    """,
+    """
+    INSERT INTO user_balances (user_id, currency, paid_cents, refunded_cents)
+    SELECT o.user_id, o.currency, sum(l.debit_cents), sum(l.credit_cents)
+    FROM ledger_lines l JOIN orders o ON o.id = l.order_id
+    WHERE l.account = 'CASH'
+    GROUP BY o.user_id, o.currency
+    """,
+]
+
+
+def recompute_balances(bind: Union[Session, Connection]) -> None:
+    """Refill every balance table from ledger_lines, in the caller's transaction."""
+    for sql in _REBUILD_SQL:
+        bind.execute(text(sql))
+
+
+def rebuild_balances(db: Session) -> Dict[str, int]:
+    """Recompute every balance table from the raw ledger in one transaction."""
+    with db.begin():
+        recompute_balances(db)
+        counts = {
+            table: db.execute(text(f"SELECT count(*) FROM {table}")).scalar_one()
+            for table in ("order_balances", "account_balances", "user_balances")
+        }
+    return counts
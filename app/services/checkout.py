@@ -0,0 +1,90 @@
+# app/services/checkout.py
+import hashlib
+from time import perf_counter
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models import Order, OrderStatus
+from app.schemas import OrderCreate
+from app.services.balances import apply_ledger_rows
+from app.services.journal import write_ledger_rows
+from app.services.idempotency import run_idempotent
+from app.services.orders import order_values
+from app.metrics import payments_total, payment_errors, checkout_latency
+
+if TYPE_CHECKING:  # the async stack is only imported when ASYNC_DB=true
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.services.group_commit import LedgerWrites
+
+
+def checkout_fingerprint(payload: OrderCreate) -> str:
+    """Method + path + hash of the normalised body: any change to the order is a different request."""
+    body = orjson.dumps(
+        {"user_id": str(payload.user_id), "amount_cents": payload.amount_cents, "currency": payload.currency.upper()},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return f"POST:/checkout:{hashlib.sha256(body).hexdigest()}"
+
+
+def _checkout(db: Session, payload: OrderCreate, writes: Optional["LedgerWrites"] = None) -> Dict:
+    """Insert the order already PAID and write DR CASH / CR REVENUE for it."""
+    order = Order(**{**order_values(payload), "status": OrderStatus.PAID})
+    db.add(order)
+    db.flush()
+
+    rows = [
+        {"order_id": order.id, "account": "CASH", "debit_cents": order.amount_cents, "credit_cents": 0},
+        {"order_id": order.id, "account": "REVENUE", "debit_cents": 0, "credit_cents": order.amount_cents},
+    ]
+    if writes is not None:
+        writes.record(order, rows)
+    else:
+        write_ledger_rows(db, rows)
+        apply_ledger_rows(db, rows, {order.id: (order.user_id, order.currency)})
+    return {
+        "id": str(order.id),
+        "user_id": str(order.user_id),
+        "amount_cents": order.amount_cents,
+        "currency": order.currency,
+        "status": OrderStatus.PAID.value,
+    }
+
+
+def checkout_idempotent(db: Session, payload: OrderCreate, idem_key: str) -> Tuple[int, bytes, str]:
+    """
+    Create-and-pay in ONE transaction (instead of POST /orders + POST /orders/{id}/pay):
+      - claim the key, fingerprinted on the request body
+      - insert the order as PAID, write DR CASH / CR REVENUE (+ balances)
+      - store the response under the key, single COMMIT
+    A retry with the same key and body replays the response (no second order);
+    the same key with a different body is a 409.
+    Returns: (status_code, response bytes, content_type)
+    """
+    start = perf_counter()
+    try:
+        result = run_idempotent(
+            db, "checkout", idem_key, checkout_fingerprint(payload),
+            lambda s, writes=None: _checkout(s, payload, writes),
+        )
+        if not result.replayed:
+            payments_total.inc()
+        return (result.status_code, result.body, result.content_type)
+
+    except HTTPException as e:
+        kind = "409_conflict" if e.status_code == 409 else (
+               "425_inflight" if e.status_code == 425 else
+               f"{e.status_code}")
+        payment_errors.labels(kind).inc()
+        raise
+    finally:
+        checkout_latency.observe(perf_counter() - start)
+
+
+async def checkout_idempotent_async(
+    db: "AsyncSession", payload: OrderCreate, idem_key: str,
+) -> Tuple[int, bytes, str]:
+    """Async flavour of checkout_idempotent (same protocol through AsyncSession.run_sync)."""
+    return await db.run_sync(checkout_idempotent, payload, idem_key)
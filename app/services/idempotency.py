@@ -0,0 +1,278 @@
+# app/services/idempotency.py
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Dict, NamedTuple, Optional, Set, Tuple
+from uuid import UUID
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import IdempotencyKey
+from app.phases import phase, span
+from app.services.idempotency_cache import response_cache
+from app.metrics import (
+    idempotency_hits, idempotency_conflicts, inflight_retries,
+    inflight_waiters, inflight_wait_seconds,
+)
+
+CONFLICT_DETAIL = "Idempotency-Key was used for a different request"
+INFLIGHT_DETAIL = "Request in flight; retry shortly"
+JSON_CONTENT_TYPE = "application/json"
+
+# Claim = take a transaction-scoped advisory lock on the key AND insert the key row,
+# in one statement. No row back means the key already exists or another request
+# holds the lock right now. Both the lock and the uncommitted row vanish on rollback,
+# so a crashed request never leaves a stale claim behind.
+_CLAIM_SQL = text("""
+    INSERT INTO idempotency_keys (key, request_fingerprint)
+    SELECT CAST(:key AS varchar), CAST(:fingerprint AS varchar)
+    WHERE pg_try_advisory_xact_lock(hashtextextended(CAST(:key AS varchar), 0))
+    ON CONFLICT (key) DO NOTHING
+    RETURNING key
+""")
+
+# Batch form of the same predicate: which of these keys can we own right now
+_LOCK_KEYS_SQL = text("""
+    SELECT k FROM unnest(CAST(:keys AS varchar[])) AS k
+    WHERE pg_try_advisory_xact_lock(hashtextextended(k, 0))
+""")
+
+
+class IdempotentResult(NamedTuple):
+    status_code: int
+    body: bytes  # response bytes, identical on every replay
+    content_type: str
+    replayed: bool  # True when served from a stored response (no side effects ran)
+
+
+def encode_response(resp: Dict) -> bytes:
+    """Serialise a response once, when it is first produced; replays reuse the bytes."""
+    return orjson.dumps(resp)
+
+
+def stored_response(row: IdempotencyKey) -> Tuple[bytes, str]:
+    """(bytes, content type) of a completed row; legacy JSON rows are encoded on the fly."""
+    if row.response_bytes is not None:
+        return bytes(row.response_bytes), row.content_type or JSON_CONTENT_TYPE
+    return encode_response(row.response_body), JSON_CONTENT_TYPE
+
+
+def check_existing(
+    row: IdempotencyKey, fingerprint: str, endpoint: str, now: datetime,
+    order_id: Optional[UUID] = None,
+) -> Optional[Tuple[int, bytes, str]]:
+    """
+    Decision table for a key row that already exists:
+      - different fingerprint -> 409
+      - completed response stored -> (status_code, body bytes, content type) to replay
+        * legacy rows without a fingerprint are bound only if the cached order_id matches
+      - in-flight lock still active (rows written by the old protocol) -> 425
+    Returns None when nobody owns the key and the caller may take it over.
+    """
+    if row.request_fingerprint and row.request_fingerprint != fingerprint:
+        idempotency_conflicts.labels(endpoint).inc()
+        raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+
+    if row.response_bytes is not None or row.response_body is not None:
+        if not row.request_fingerprint and row.response_body is not None:
+            cached_order = row.response_body.get("order_id")
+            if order_id is not None and cached_order and str(cached_order) != str(order_id):
+                idempotency_conflicts.labels(endpoint).inc()
+                raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+            row.request_fingerprint = fingerprint
+        idempotency_hits.labels(endpoint).inc()
+        return (row.status_code or 200, *stored_response(row))
+
+    if row.locked_until and row.locked_until > now:
+        inflight_retries.labels(endpoint).inc()
+        raise HTTPException(status_code=425, detail=INFLIGHT_DETAIL)
+
+    return None
+
+
+def _load_key(db: Session, idem_key: str, for_update: bool = False) -> Optional[IdempotencyKey]:
+    stmt = select(IdempotencyKey).where(IdempotencyKey.key == idem_key).execution_options(populate_existing=True)
+    if for_update:
+        stmt = stmt.with_for_update()
+    return db.execute(stmt).scalar_one_or_none()
+
+
+def _claim(db: Session, idem_key: str, fingerprint: str) -> bool:
+    return db.execute(_CLAIM_SQL, {"key": idem_key, "fingerprint": fingerprint}).first() is not None
+
+
+def claim_many(db: Session, fingerprints: Dict[str, str]) -> Tuple[Set[str], Set[str]]:
+    """
+    _claim for many keys (key -> fingerprint): take each key's advisory lock without
+    waiting, then insert claim rows for the locked keys in one INSERT ... ON CONFLICT.
+    Keys go in sorted order, so concurrent batches never wait on each other in a cycle.
+    Returns (locked, claimed): a key that isn't locked belongs to an in-flight request
+    (425); one locked but not claimed already has a committed row for check_existing.
+    """
+    keys = sorted(fingerprints)
+    locked = set(db.scalars(_LOCK_KEYS_SQL, {"keys": keys})) if keys else set()
+    claimed: Set[str] = set()
+    if locked:
+        claimed = set(db.scalars(
+            pg_insert(IdempotencyKey)
+            .values([{"key": k, "request_fingerprint": fingerprints[k]} for k in keys if k in locked])
+            .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+            .returning(IdempotencyKey.key)
+        ))
+    return locked, claimed
+
+
+def _try_lock(db: Session, idem_key: str) -> bool:
+    return bool(db.scalar(select(func.pg_try_advisory_xact_lock(func.hashtextextended(idem_key, 0)))))
+
+
+def _wait_for_owner(db: Session, idem_key: str, endpoint: str, timeout: float) -> bool:
+    """
+    Block on the key's advisory lock for at most `timeout` seconds. The owner holds
+    it until its transaction ends, so getting it means the owner has committed its
+    response (or rolled back). Runs in a savepoint so a lock timeout leaves the
+    outer transaction usable. Returns True once we hold the lock.
+    """
+    start = perf_counter()
+    inflight_waiters.labels(endpoint).inc()
+    acquired = False
+    try:
+        prev = db.scalar(text("SELECT current_setting('lock_timeout')"))
+        with db.begin_nested():
+            db.execute(text("SELECT set_config('lock_timeout', :t, true)"), {"t": f"{int(timeout * 1000)}ms"})
+            db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(idem_key, 0))))
+        db.execute(text("SELECT set_config('lock_timeout', :t, true)"), {"t": prev})
+        acquired = True
+    except OperationalError as e:
+        if getattr(e.orig, "sqlstate", None) != "55P03":  # lock_not_available
+            raise
+    finally:
+        inflight_waiters.labels(endpoint).dec()
+        inflight_wait_seconds.labels(endpoint, "done" if acquired else "timeout").observe(perf_counter() - start)
+    return acquired
+
+
+def _wait_or_425(db: Session, idem_key: str, endpoint: str, wait: bool) -> None:
+    """Someone else owns the key right now: wait for them if enabled, else 425 Too Early."""
+    timeout = settings.idempotency_wait_secs if wait else 0.0
+    if timeout > 0 and _wait_for_owner(db, idem_key, endpoint, timeout):
+        return
+    inflight_retries.labels(endpoint).inc()
+    raise HTTPException(status_code=425, detail=INFLIGHT_DETAIL)
+
+
+def claim_and_run(
+    db: Session, endpoint: str, idem_key: str, fingerprint: str,
+    mutate: Callable[[Session], Dict], order_id: Optional[UUID] = None,
+    wait: bool = True,
+) -> IdempotentResult:
+    """
+    Claim the key, run `mutate` and store its response, all inside the caller's
+    transaction (nothing here commits). Raises HTTPException 409 / 425 like before;
+    anything `mutate` raises aborts the transaction and releases the claim.
+    With IDEMPOTENCY_WAIT_SECS > 0 (and wait=True) a duplicate of an in-flight
+    request waits for the owner and replays its response instead of answering 425.
+    """
+    with phase(endpoint, "claim"):
+        replay = _claim_or_replay(db, endpoint, idem_key, fingerprint, order_id, wait)
+    if replay is not None:
+        return replay
+
+    body = encode_response(mutate(db))
+
+    with phase(endpoint, "store_response"):
+        db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == idem_key)
+            .values(status_code=200, response_bytes=body, content_type=JSON_CONTENT_TYPE, locked_until=None)
+            .execution_options(synchronize_session=False)
+        )
+    return IdempotentResult(200, body, JSON_CONTENT_TYPE, False)
+
+
+def _claim_or_replay(
+    db: Session, endpoint: str, idem_key: str, fingerprint: str, order_id: Optional[UUID], wait: bool,
+) -> Optional[IdempotentResult]:
+    """Own the key (None) or return the stored response to replay."""
+    now = datetime.now(timezone.utc)
+
+    claimed = _claim(db, idem_key, fingerprint)
+    row = None
+    if not claimed:
+        row = _load_key(db, idem_key)
+        if row is None:
+            # Another request holds the advisory lock and hasn't committed its claim yet
+            _wait_or_425(db, idem_key, endpoint, wait)
+            # The owner is done. We hold the lock now, so re-claiming can't race anyone:
+            # no row back means the owner committed a response we can replay.
+            claimed = _claim(db, idem_key, fingerprint)
+            if not claimed:
+                row = _load_key(db, idem_key)
+
+    if not claimed:
+        replay = check_existing(row, fingerprint, endpoint, now, order_id)
+        if replay is not None:
+            return IdempotentResult(*replay, True)
+
+        # Left without a response (e.g. an old-protocol request that failed): take it
+        # over, but only while holding the advisory lock, and re-read after locking.
+        if not _try_lock(db, idem_key):
+            _wait_or_425(db, idem_key, endpoint, wait)
+        row = _load_key(db, idem_key, for_update=True)
+        replay = check_existing(row, fingerprint, endpoint, now, order_id)
+        if replay is not None:
+            return IdempotentResult(*replay, True)
+        row.request_fingerprint = row.request_fingerprint or fingerprint
+        row.locked_until = None
+    return None
+
+
+def run_idempotent(
+    db: Session, endpoint: str, idem_key: str, fingerprint: str,
+    mutate: Callable[..., Dict], order_id: Optional[UUID] = None,
+) -> IdempotentResult:
+    """
+    Shared idempotency engine for pay / refund:
+      - in-process response cache first (no DB round trip on a hit)
+      - then ONE transaction: claim key -> mutate -> store response -> single COMMIT
+        (with GROUP_COMMIT_ENABLED, one transaction shared with concurrent requests;
+        `mutate` is then called as mutate(db, writes), see app/services/group_commit.py)
+    `order_id` enables the legacy binding check for rows stored without a fingerprint.
+    """
+    with span(endpoint):
+        with phase(endpoint, "cache_lookup"):
+            cached = response_cache.get(idem_key, endpoint)
+        if cached is not None:
+            if cached.fingerprint != fingerprint:
+                idempotency_conflicts.labels(endpoint).inc()
+                raise HTTPException(status_code=409, detail=CONFLICT_DETAIL)
+            idempotency_hits.labels(endpoint).inc()
+            return IdempotentResult(cached.status_code, cached.body, cached.content_type, True)
+
+        committer = None
+        if settings.group_commit_enabled:  # imported only then, as in the lifespan
+            from app.services.group_commit import group_committer as committer
+
+        result = None
+        if committer is not None and committer.running:
+            # Shares a transaction (and its COMMIT) with other requests; `db` isn't used.
+            # None when the committer is shutting down: fall through to our own transaction
+            with phase(endpoint, "group_commit"):
+                result = committer.run(endpoint, idem_key, fingerprint, mutate, order_id)
+        if result is None:
+            txn = db.begin()
+            try:
+                result = claim_and_run(db, endpoint, idem_key, fingerprint, mutate, order_id)
+            except BaseException:
+                txn.rollback()
+                raise
+            with phase(endpoint, "commit"):
+                txn.commit()
+
+        response_cache.put(idem_key, fingerprint, result.status_code, result.body, result.content_type)
+        return result
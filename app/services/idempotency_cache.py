@@ -0,0 +1,78 @@
+# app/services/idempotency_cache.py
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import NamedTuple, Optional
+
+from app.config import settings
+from app.metrics import (
+    idempotency_cache_hits, idempotency_cache_misses, idempotency_cache_evictions
+)
+
+
+class CachedResponse(NamedTuple):
+    fingerprint: str
+    status_code: int
+    body: bytes
+    content_type: str
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Bounded in-process LRU of COMPLETED idempotent responses.
+
+    Only frozen responses are stored (they never change once written), so a hit
+    can be answered without touching Postgres. Entries expire after `ttl` seconds;
+    the least recently used entry is dropped once `maxsize` is reached.
+    maxsize <= 0 disables the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str, endpoint: str) -> Optional[CachedResponse]:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry.expires_at <= monotonic():
+                del self._data[key]
+                idempotency_cache_evictions.labels("ttl").inc()
+                entry = None
+            if entry is None:
+                idempotency_cache_misses.labels(endpoint).inc()
+                return None
+            self._data.move_to_end(key)
+        idempotency_cache_hits.labels(endpoint).inc()
+        return entry
+
+    def put(
+        self, key: str, fingerprint: str, status_code: int, body: bytes,
+        content_type: str = "application/json",
+    ) -> None:
+        if self.maxsize <= 0:
+            return
+        entry = CachedResponse(fingerprint, status_code, body, content_type, monotonic() + self.ttl)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                idempotency_cache_evictions.labels("size").inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+response_cache = ResponseCache(
+    maxsize=settings.idempotency_cache_size,
+    ttl=settings.idempotency_cache_ttl_secs,
+)
@@ -0,0 +1,76 @@
+# app/services/idempotency_gc.py
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from time import sleep
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.metrics import idempotency_keys_swept
+
+log = logging.getLogger(__name__)
+
+# Small batches keep each DELETE short: row locks are held only for one batch, and
+# SKIP LOCKED steps around any key a live request is touching. Keys still in flight
+# (locked_until in the future) are never selected.
+_SWEEP_SQL = text("""
+    DELETE FROM idempotency_keys
+    WHERE ctid IN (
+        SELECT ctid FROM idempotency_keys
+        WHERE created_at < :cutoff
+          AND (locked_until IS NULL OR locked_until < now())
+        ORDER BY created_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+""")
+
+
+def sweep_expired_keys(
+    engine: Engine,
+    retention: timedelta,
+    batch_size: int,
+    pause_secs: float,
+    stop: Optional[threading.Event] = None,
+) -> int:
+    """
+    Delete keys older than `retention`, one committed batch at a time, sleeping
+    `pause_secs` between batches. Returns the number of keys deleted.
+    """
+    cutoff = datetime.now(timezone.utc) - retention
+    total = 0
+    while stop is None or not stop.is_set():
+        with engine.begin() as conn:
+            deleted = conn.execute(_SWEEP_SQL, {"cutoff": cutoff, "batch_size": batch_size}).rowcount
+        total += deleted
+        idempotency_keys_swept.inc(deleted)
+        if deleted < batch_size:
+            break
+        sleep(pause_secs)
+    return total
+
+
+async def run_sweeper(engine: Engine, stop: threading.Event) -> None:
+    """
+    Lifespan task: sweep every IDEMPOTENCY_GC_INTERVAL_SECS. On shutdown set `stop`
+    (the worker thread finishes its current batch) and cancel the task.
+    """
+    while not stop.is_set():
+        try:
+            deleted = await asyncio.to_thread(
+                sweep_expired_keys,
+                engine,
+                timedelta(hours=settings.idempotency_retention_hours),
+                settings.idempotency_gc_batch_size,
+                settings.idempotency_gc_pause_secs,
+                stop,
+            )
+            if deleted:
+                log.info("idempotency sweeper deleted %d expired keys", deleted)
+        except Exception:
+            log.exception("idempotency sweeper failed; retrying next interval")
+        await asyncio.sleep(settings.idempotency_gc_interval_secs)
@@ -0,0 +1,56 @@
+# app/services/journal.py
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import ACCOUNT_IDS, JournalTransaction, LedgerEntry, Posting
+
+
+def journal_groups(rows: Sequence[Mapping]) -> List[Tuple[UUID, List[Mapping]]]:
+    """
+    Split ledger rows into journal transactions: consecutive rows of one order form
+    one transaction until an account repeats (a payment and a refund of the same
+    order in one batch are two transactions, one posting per account each).
+    """
+    groups: List[Tuple[UUID, List[Mapping]]] = []
+    accounts: set = set()
+    for r in rows:
+        if not groups or groups[-1][0] != r["order_id"] or r["account"] in accounts:
+            groups.append((r["order_id"], []))
+            accounts = set()
+        groups[-1][1].append(r)
+        accounts.add(r["account"])
+    return groups
+
+
+def write_ledger_rows(db: Session, rows: Sequence[Mapping], model: Optional[str] = None) -> None:
+    """
+    Insert ledger rows (dicts with order_id, account, debit_cents, credit_cents) in
+    the LEDGER_MODEL representation; balances are the caller's (apply_ledger_rows).
+    """
+    if not rows:
+        return
+    if (model or settings.ledger_model) == "entries":
+        db.execute(insert(LedgerEntry).values(list(rows)))
+        return
+
+    groups = journal_groups(rows)
+    # sort_by_parameter_order keeps the returned ids aligned with `groups`
+    journal_ids = db.scalars(
+        insert(JournalTransaction).returning(JournalTransaction.id, sort_by_parameter_order=True),
+        [{"order_id": order_id} for order_id, _ in groups],
+    ).all()
+    postings: List[Dict] = [
+        {
+            "journal_id": journal_id,
+            "account_id": ACCOUNT_IDS[r["account"]],
+            "debit_cents": r["debit_cents"],
+            "credit_cents": r["credit_cents"],
+        }
+        for journal_id, (_, group) in zip(journal_ids, groups)
+        for r in group
+    ]
+    db.execute(insert(Posting).values(postings))
@@ -0,0 +1,63 @@
+# app/services/ledger.py
+from typing import TYPE_CHECKING, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.orm import Session
+
+from app.models import LedgerLine, OrderBalance
+from app.pagination import decode_cursor, next_cursor
+
+if TYPE_CHECKING:  # the async stack is only imported when ASYNC_DB=true
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def _entries_stmt(order_id: UUID):
+    # ledger_lines: legacy ledger_entries rows and journal postings alike
+    return select(LedgerLine).where(LedgerLine.order_id == order_id)
+
+
+def _totals_stmt(order_id: UUID):
+    # Reads the maintained per-(order, account) balances: at most one row per account
+    return select(
+        func.coalesce(func.sum(OrderBalance.debit_cents), 0).label("debits"),
+        func.coalesce(func.sum(OrderBalance.credit_cents), 0).label("credits"),
+    ).where(OrderBalance.order_id == order_id)
+
+
+def _summary(order_id: UUID, totals) -> Dict:
+    return {
+        "order_id": order_id,
+        "total_debits": int(totals.debits or 0),
+        "total_credits": int(totals.credits or 0),
+    }
+
+
+def order_ledger(db: Session, order_id: UUID) -> List[LedgerLine]:
+    return db.execute(_entries_stmt(order_id)).scalars().all()
+
+
+def order_ledger_summary(db: Session, order_id: UUID) -> Dict:
+    return _summary(order_id, db.execute(_totals_stmt(order_id)).one())
+
+
+def order_ledger_page(db: Session, order_id: UUID, limit: int, cursor: Optional[str] = None) -> Dict:
+    """Keyset page of one order's ledger, oldest first, on (created_at, id)."""
+    stmt = (
+        _entries_stmt(order_id)
+        .order_by(LedgerLine.created_at, LedgerLine.id)
+        .limit(limit + 1)
+    )
+    after = decode_cursor(cursor)
+    if after is not None:
+        stmt = stmt.where(tuple_(LedgerLine.created_at, LedgerLine.id) > tuple_(*after))
+    rows = db.execute(stmt).scalars().all()
+    return {"items": rows[:limit], "next_cursor": next_cursor(rows, limit)}
+
+
+async def order_ledger_async(db: "AsyncSession", order_id: UUID) -> List[LedgerLine]:
+    return (await db.execute(_entries_stmt(order_id))).scalars().all()
+
+
+async def order_ledger_summary_async(db: "AsyncSession", order_id: UUID) -> Dict:
+    return _summary(order_id, (await db.execute(_totals_stmt(order_id))).one())
@@ -0,0 +1,91 @@
+# app/services/ledger_export.py
+import zlib
+from datetime import datetime
+from typing import Iterator, Literal, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from app.db import engine
+from app.models import LedgerLine
+
+# Rows fetched per round trip from the server-side cursor (and per chunk sent)
+CHUNK_ROWS = 2000
+
+_ledger = LedgerLine.__table__  # both ledger models
+_COLUMNS = ("id", "order_id", "account", "debit_cents", "credit_cents", "created_at")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip: q=0 refuses it, `*` covers it when unlisted."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding] = q
+    q = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return q > 0
+
+
+def _ndjson(rows) -> str:
+    # Every field is a uuid, a constrained account code, an int or a timestamp,
+    # so nothing needs escaping and we can skip json.dumps per row.
+    return "".join(
+        f'{{"id":"{r[0]}","order_id":"{r[1]}","account":"{r[2]}",'
+        f'"debit_cents":{r[3]},"credit_cents":{r[4]},"created_at":"{r[5].isoformat()}"}}\n'
+        for r in rows
+    )
+
+
+def _csv(rows) -> str:
+    return "".join(f"{r[0]},{r[1]},{r[2]},{r[3]},{r[4]},{r[5].isoformat()}\n" for r in rows)
+
+
+def stream_ledger(
+    start: datetime, end: datetime, fmt: Literal["ndjson", "csv"], gzip: bool = False,
+    bind: Optional[Engine] = None,
+) -> Iterator[bytes]:
+    """
+    Yield ledger lines with start <= created_at < end, oldest first.
+
+    Rows come through a server-side cursor CHUNK_ROWS at a time as plain tuples
+    (no ORM objects), are encoded straight to bytes and optionally gzipped on the
+    fly, so memory stays flat however large the range is. `bind` picks the engine
+    (e.g. the read replica); defaults to the primary.
+    """
+    encode = _ndjson if fmt == "ndjson" else _csv
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None  # wbits=31 -> gzip container
+
+    def out(data: bytes) -> bytes:
+        return gz.compress(data) if gz else data
+
+    stmt = (
+        select(*(_ledger.c[name] for name in _COLUMNS))
+        .where(_ledger.c.created_at >= start, _ledger.c.created_at < end)
+        .order_by(_ledger.c.created_at, _ledger.c.id)
+    )
+
+    if fmt == "csv":
+        yield out((",".join(_COLUMNS) + "\n").encode())
+
+    with (bind or engine).connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(stmt)
+        for rows in result.partitions():
+            chunk = out(encode(rows).encode())
+            if chunk:
+                yield chunk
+
+    if gz:
+        yield gz.flush()
@@ -0,0 +1,109 @@
+# app/services/orders.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.orm import Session, selectinload
+
+from app.models import Order, OrderStatus
+from app.pagination import decode_cursor, next_cursor
+from app.schemas import OrderCreate
+
+
+def order_values(payload: OrderCreate) -> Dict[str, Any]:
+    """Column values for a new PENDING order (same normalisation for single + batch)."""
+    return {
+        "id": uuid4(),
+        "user_id": payload.user_id,
+        "amount_cents": payload.amount_cents,
+        "currency": payload.currency.upper(),
+        "status": OrderStatus.PENDING,
+    }
+
+
+def touch(order: Order) -> None:
+    """Bump a loaded order's version and updated_at (flushed with its other changes)."""
+    order.version = Order.version + 1
+    order.updated_at = func.now()
+
+
+def touch_values() -> Dict[str, Any]:
+    """The same bump for bulk UPDATEs."""
+    return {"version": Order.version + 1, "updated_at": func.now()}
+
+
+def create_orders_batch(db: Session, items: List[Any]) -> List[Dict]:
+    """
+    Bulk order creation:
+      - Validate every item against OrderCreate; invalid items are reported, not fatal
+      - Insert all valid orders with one multi-row INSERT ... RETURNING in a single transaction
+      - Results come back in input order: {"index", "order"} or {"index", "errors"}
+    """
+    results: List[Dict] = [{"index": i} for i in range(len(items))]
+    rows: List[Dict[str, Any]] = []
+    positions: List[int] = []
+
+    for i, raw in enumerate(items):
+        try:
+            payload = OrderCreate.model_validate(raw)
+        except ValidationError as e:
+            results[i]["errors"] = e.errors(include_url=False, include_context=False, include_input=False)
+            continue
+        rows.append(order_values(payload))
+        positions.append(i)
+
+    if rows:
+        with db.begin():
+            # sort_by_parameter_order keeps RETURNING rows aligned with `rows`
+            # even when SQLAlchemy splits the statement into several batches.
+            created = db.execute(
+                insert(Order).returning(
+                    Order.id, Order.user_id, Order.amount_cents, Order.currency, Order.status,
+                    sort_by_parameter_order=True,
+                ),
+                rows,
+            ).mappings().all()
+
+        for i, order in zip(positions, created):
+            results[i]["order"] = dict(order)
+
+    return results
+
+
+_ORDER_FIELDS = ("id", "user_id", "amount_cents", "currency", "status", "created_at", "updated_at")
+_LEDGER_FIELDS = ("id", "order_id", "account", "debit_cents", "credit_cents")
+
+
+def list_orders(
+    db: Session, *, limit: int, cursor: Optional[str] = None, user_id: Optional[UUID] = None,
+    status: Optional[OrderStatus] = None, created_after: Optional[datetime] = None,
+    include_ledger: bool = False,
+) -> Dict:
+    """
+    Keyset page of orders ordered by (created_at, id).
+    With include_ledger, the page's ledger rows come from ONE batched
+    `WHERE order_id IN (...)` query instead of a lazy load per order.
+    """
+    stmt = select(Order).order_by(Order.created_at, Order.id).limit(limit + 1)
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+    if status is not None:
+        stmt = stmt.where(Order.status == status)
+    if created_after is not None:
+        stmt = stmt.where(Order.created_at > created_after)
+    after = decode_cursor(cursor)
+    if after is not None:
+        stmt = stmt.where(tuple_(Order.created_at, Order.id) > tuple_(*after))
+    if include_ledger:
+        stmt = stmt.options(selectinload(Order.ledger_entries))
+
+    orders = db.execute(stmt).scalars().all()
+    items = []
+    for o in orders[:limit]:
+        item = {f: getattr(o, f) for f in _ORDER_FIELDS}
+        if include_ledger:
+            item["ledger_entries"] = [{f: getattr(e, f) for f in _LEDGER_FIELDS} for e in o.ledger_entries]
+        items.append(item)
+    return {"items": items, "next_cursor": next_cursor(orders, limit)}
@@ -1,110 +1,93 @@
 # app/services/payments.py
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from time import perf_counter
-from typing import Tuple, Dict
+from typing import TYPE_CHECKING, Tuple, Dict, List, Optional
 from uuid import UUID
 
+import orjson
 from fastapi import HTTPException
-from sqlalchemy import select
+from sqlalchemy import delete, select, update
 from sqlalchemy.orm import Session
 
-from app.models import Order, OrderStatus, LedgerEntry, IdempotencyKey
+from app.models import Order, OrderStatus, IdempotencyKey
+from app.services.idempotency import (
+    CONFLICT_DETAIL, INFLIGHT_DETAIL, JSON_CONTENT_TYPE, check_existing, claim_many, encode_response,
+    run_idempotent,
+)
+from app.services.idempotency_cache import response_cache
+from app.services.balances import apply_ledger_rows
+from app.services.journal import write_ledger_rows
+from app.services.orders import touch, touch_values
+from app.phases import phase
 from app.metrics import (
     payments_total, idempotency_hits, idempotency_conflicts,
-    inflight_retries, payment_errors, payment_latency
+    inflight_retries, payment_errors, payment_latency, payment_batch_latency
 )
 
-# How long a request with a given idempotency key is considered "in flight"
-LOCK_WINDOW_SECS = 15
+if TYPE_CHECKING:  # the async stack is only imported when ASYNC_DB=true
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.services.group_commit import LedgerWrites
+
+
+def _pay(db: Session, order_id: UUID, writes: Optional["LedgerWrites"] = None) -> Dict:
+    """
+    Lock the order row; if PENDING write DR CASH / CR REVENUE and mark PAID, if PAID no-op.
+    With `writes` (group commit) the rows and status change are recorded there instead.
+    """
+    with phase("pay", "lock_order"):
+        order = db.execute(
+            select(Order).where(Order.id == order_id).with_for_update()
+        ).scalar_one_or_none()
+
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    status = writes.status(order) if writes is not None else order.status
+    if status != OrderStatus.PAID:
+        # Double-entry: DR CASH, CR REVENUE
+        rows = [
+            {"order_id": order.id, "account": "CASH", "debit_cents": order.amount_cents, "credit_cents": 0},
+            {"order_id": order.id, "account": "REVENUE", "debit_cents": 0, "credit_cents": order.amount_cents},
+        ]
+        with phase("pay", "ledger_write"):
+            if writes is not None:
+                writes.record(order, rows, OrderStatus.PAID)
+            else:
+                write_ledger_rows(db, rows)
+                apply_ledger_rows(db, rows, {order.id: (order.user_id, order.currency)})
+                order.status = OrderStatus.PAID
+                touch(order)
+                db.flush()  # the UPDATE runs here, not in COMMIT
+    return {"order_id": str(order.id), "status": "PAID"}
 
 
-def pay_order_idempotent(db: Session, order_id: UUID, idem_key: str) -> Tuple[int, Dict]:
+def pay_order_idempotent(db: Session, order_id: UUID, idem_key: str) -> Tuple[int, bytes, str]:
     """
-    Idempotent payment flow:
+    Idempotent payment flow (see app/services/idempotency.py for the protocol):
       - Bind Idempotency-Key to THIS request via a fingerprint (method + path + order_id)
       - If a response for this key is cached -> return it (no duplicate side effects)
+        * Checked in the in-process response cache first, then in Postgres
         * Hardened: legacy rows without a fingerprint are validated against cached order_id
       - If request with this key is currently in-flight -> 425 Too Early
-      - Else do one atomic transaction:
+      - Else ONE transaction (single commit):
+          * claim the key
           * lock order row
           * if PENDING: write DR CASH / CR REVENUE and mark PAID
           * if already PAID: no-op
-      - Cache exact response under the key
-    Returns: (status_code, response_json)
+          * store the exact response under the key
+    Returns: (status_code, response bytes, content_type); replays return the stored bytes verbatim
     """
     start = perf_counter()
-    now = datetime.now(timezone.utc)
     fingerprint = f"POST:/orders/{order_id}/pay"
 
     try:
-        row = db.get(IdempotencyKey, idem_key)
-
-        # Same key but for a different request? -> 409
-        if row and row.request_fingerprint and row.request_fingerprint != fingerprint:
-            idempotency_conflicts.labels("pay").inc()
-            raise HTTPException(status_code=409, detail="Idempotency-Key was used for a different request")
-
-        # Completed response cached?
-        if row and row.response_body is not None:
-            # Legacy hardening: if fingerprint missing, bind only if same order
-            if not row.request_fingerprint:
-                cached_order = row.response_body.get("order_id")
-                if cached_order and str(cached_order) != str(order_id):
-                    idempotency_conflicts.labels("pay").inc()
-                    raise HTTPException(status_code=409, detail="Idempotency-Key was used for a different request")
-                row.request_fingerprint = fingerprint
-                db.commit()
-            idempotency_hits.labels("pay").inc()
-            return (row.status_code or 200, row.response_body)
-
-        # In-flight lock active?
-        if row and row.locked_until and row.locked_until > now:
-            inflight_retries.labels("pay").inc()
-            raise HTTPException(status_code=425, detail="Request in flight; retry shortly")
-
-        # Set / refresh in-flight lock and persist fingerprint
-        lock_until = now + timedelta(seconds=LOCK_WINDOW_SECS)
-        if not row:
-            row = IdempotencyKey(key=idem_key, request_fingerprint=fingerprint, locked_until=lock_until)
-            db.add(row)
-        else:
-            if not row.request_fingerprint:
-                row.request_fingerprint = fingerprint
-            row.locked_until = lock_until
-        db.commit()
-
-        # Do the payment atomically with the order row locked
-        with db.begin():
-            order = db.execute(
-                select(Order).where(Order.id == order_id).with_for_update()
-            ).scalar_one_or_none()
-
-            if not order:
-                raise HTTPException(status_code=404, detail="Order not found")
-
-            if order.status == OrderStatus.PAID:
-                resp = {"order_id": str(order.id), "status": "PAID"}
-            else:
-                # Double-entry: DR CASH, CR REVENUE
-                db.add(LedgerEntry(
-                    order_id=order.id, account="CASH",
-                    debit_cents=order.amount_cents, credit_cents=0
-                ))
-                db.add(LedgerEntry(
-                    order_id=order.id, account="REVENUE",
-                    debit_cents=0, credit_cents=order.amount_cents
-                ))
-                order.status = OrderStatus.PAID
-                resp = {"order_id": str(order.id), "status": "PAID"}
-
-        # Cache the response and clear the lock
-        row.status_code = 200
-        row.response_body = resp
-        row.locked_until = None
-        db.commit()
-
-        payments_total.inc()
-        return (200, resp)
+        result = run_idempotent(
+            db, "pay", idem_key, fingerprint,
+            lambda s, writes=None: _pay(s, order_id, writes), order_id=order_id,
+        )
+        if not result.replayed:
+            payments_total.inc()
+        return (result.status_code, result.body, result.content_type)
 
     except HTTPException as e:
         kind = "409_conflict" if e.status_code == 409 else (
@@ -114,3 +97,171 @@ def pay_order_idempotent(db: Session, order_id: UUID, idem_key: str) -> Tuple[in
         raise
     finally:
         payment_latency.observe(perf_counter() - start)
+
+
+async def pay_order_idempotent_async(
+    db: "AsyncSession", order_id: UUID, idem_key: str,
+) -> Tuple[int, bytes, str]:
+    """
+    Async flavour of pay_order_idempotent for the async engine.
+    Runs the exact same protocol through AsyncSession.run_sync (greenlet, no thread).
+    """
+    return await db.run_sync(pay_order_idempotent, order_id, idem_key)
+
+
+def _batch_item(order_id: UUID, idem_key: str, status_code: int, body: Dict) -> Dict:
+    return {"order_id": order_id, "idempotency_key": idem_key, "status_code": status_code, "body": body}
+
+
+def pay_orders_batch(db: Session, items: List[Tuple[UUID, str]]) -> List[Dict]:
+    """
+    Settle many (order_id, Idempotency-Key) pairs in ONE transaction:
+      - claim keys in key order under the same advisory lock as the single path
+        (claim_many): one try-lock query + one INSERT ... ON CONFLICT DO NOTHING;
+        keys held by a concurrent request come back as 425 (retry)
+      - load the remaining keys with one SELECT ... FOR UPDATE SKIP LOCKED
+      - lock the orders with one SELECT ... FOR UPDATE ordered by id (deadlock-free)
+      - write all DR CASH / CR REVENUE rows with one multi-row INSERT (+ balance upserts)
+      - cache every response under its key; keys claimed for an order that turns
+        out not to exist are deleted again, as the single path's rollback would
+    Fingerprint / 409 / 425 semantics match pay_order_idempotent.
+    A key repeated inside the batch is processed once; later copies get the same
+    result (or 409 if they point at a different order).
+    Returns one result per input item, in input order.
+    """
+    start = perf_counter()
+    now = datetime.now(timezone.utc)
+    results: List[Optional[Dict]] = [None] * len(items)
+
+    # First occurrence of each key wins; duplicates are resolved after the transaction
+    first: Dict[str, Tuple[int, UUID, str]] = {}
+    for i, (order_id, idem_key) in enumerate(items):
+        first.setdefault(idem_key, (i, order_id, f"POST:/orders/{order_id}/pay"))
+
+    # key -> order_id for keys this batch will actually execute
+    to_pay: Dict[str, UUID] = {}
+    responses: Dict[str, Tuple[int, Dict]] = {}
+    replayed: Dict[str, Tuple[str, bytes]] = {}  # key -> (fingerprint, stored bytes) read from the DB
+
+    try:
+        # Keys already answered in this process never reach the DB
+        pending: Dict[str, Tuple[int, UUID, str]] = {}
+        for idem_key, (i, order_id, fingerprint) in first.items():
+            cached = response_cache.get(idem_key, "pay_batch")
+            if cached is None:
+                pending[idem_key] = (i, order_id, fingerprint)
+            elif cached.fingerprint != fingerprint:
+                idempotency_conflicts.labels("pay_batch").inc()
+                responses[idem_key] = (409, {"detail": CONFLICT_DETAIL})
+            else:
+                idempotency_hits.labels("pay_batch").inc()
+                responses[idem_key] = (cached.status_code, orjson.loads(cached.body))
+
+        with db.begin():
+            locked, claimed = claim_many(db, {k: fp for k, (_, _, fp) in pending.items()})
+
+            others = [k for k in pending if k in locked and k not in claimed]
+            existing = {}
+            if others:
+                existing = {row.key: row for row in db.scalars(
+                    select(IdempotencyKey)
+                    .where(IdempotencyKey.key.in_(others))
+                    .with_for_update(skip_locked=True)
+                )}
+
+            for idem_key, (_, order_id, fingerprint) in pending.items():
+                if idem_key in claimed:
+                    to_pay[idem_key] = order_id
+                    continue
+                row = existing.get(idem_key)
+                if row is None:
+                    # Owned by a request that is running right now
+                    inflight_retries.labels("pay_batch").inc()
+                    responses[idem_key] = (425, {"detail": INFLIGHT_DETAIL})
+                    continue
+                try:
+                    replay = check_existing(row, fingerprint, "pay_batch", now, order_id)
+                except HTTPException as e:
+                    responses[idem_key] = (e.status_code, {"detail": e.detail})
+                    continue
+                if replay is not None:
+                    status_code, body, _ = replay
+                    responses[idem_key] = (status_code, orjson.loads(body))
+                    replayed[idem_key] = (fingerprint, body)
+                    continue
+                # Stale claim (lock expired without a response): take it over; the row
+                # itself is only updated once there is a response to store
+                to_pay[idem_key] = order_id
+            db.flush()
+
+            orders = {}
+            if to_pay:
+                orders = {o.id: o for o in db.execute(
+                    select(Order.id, Order.user_id, Order.currency, Order.amount_cents, Order.status)
+                    .where(Order.id.in_(set(to_pay.values())))
+                    .order_by(Order.id)
+                    .with_for_update()
+                )}
+
+            ledger_rows: List[Dict] = []
+            paid_now = set()
+            for idem_key, order_id in to_pay.items():
+                order = orders.get(order_id)
+                if order is None:
+                    responses[idem_key] = (404, {"detail": "Order not found"})
+                    continue
+                if order.status != OrderStatus.PAID and order_id not in paid_now:
+                    # Double-entry: DR CASH, CR REVENUE
+                    ledger_rows.append({"order_id": order_id, "account": "CASH",
+                                        "debit_cents": order.amount_cents, "credit_cents": 0})
+                    ledger_rows.append({"order_id": order_id, "account": "REVENUE",
+                                        "debit_cents": 0, "credit_cents": order.amount_cents})
+                    paid_now.add(order_id)
+                responses[idem_key] = (200, {"order_id": str(order_id), "status": "PAID"})
+
+            if ledger_rows:
+                write_ledger_rows(db, ledger_rows)
+                apply_ledger_rows(db, ledger_rows, {o.id: (o.user_id, o.currency) for o in orders.values()})
+                db.execute(
+                    update(Order).where(Order.id.in_(paid_now)).values(status=OrderStatus.PAID, **touch_values()),
+                    execution_options={"synchronize_session": False},
+                )
+
+            # Encoded once; the bytes are what single-request replays send verbatim
+            encoded = {k: encode_response(responses[k][1]) for k in to_pay if responses[k][0] == 200}
+            if encoded:
+                db.execute(update(IdempotencyKey), [
+                    {"key": k, "request_fingerprint": first[k][2], "status_code": 200, "response_bytes": body,
+                     "content_type": JSON_CONTENT_TYPE, "locked_until": None}
+                    for k, body in encoded.items()
+                ])
+            # Same end state as the single path rolling back its claim on 404
+            unanswered = [k for k in claimed if k not in encoded]
+            if unanswered:
+                db.execute(
+                    delete(IdempotencyKey).where(IdempotencyKey.key.in_(unanswered)),
+                    execution_options={"synchronize_session": False},
+                )
+
+        for idem_key, (fingerprint, body) in replayed.items():
+            response_cache.put(idem_key, fingerprint, responses[idem_key][0], body)
+        for idem_key, body in encoded.items():
+            response_cache.put(idem_key, first[idem_key][2], 200, body)
+        payments_total.inc(sum(1 for k in to_pay if responses[k][0] == 200))
+
+        for i, (order_id, idem_key) in enumerate(items):
+            first_index, first_order, _ = first[idem_key]
+            if i != first_index and first_order != order_id:
+                idempotency_conflicts.labels("pay_batch").inc()
+                status_code, body = 409, {"detail": CONFLICT_DETAIL}
+            else:
+                status_code, body = responses[idem_key]
+            if status_code != 200:
+                kind = "409_conflict" if status_code == 409 else (
+                       "425_inflight" if status_code == 425 else
+                       f"{status_code}")
+                payment_errors.labels(kind).inc()
+            results[i] = _batch_item(order_id, idem_key, status_code, body)
+        return results
+    finally:
+        payment_batch_latency.observe(perf_counter() - start)
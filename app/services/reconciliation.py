@@ -0,0 +1,258 @@
+# app/services/reconciliation.py
+"""
+Ledger reconciliation (python -m app.cli reconcile).
+
+Checks that the double-entry ledger actually balances:
+
+  - global and per-currency: total debits == total credits
+  - per account / currency: ledger totals match the account_balances rollup
+  - per order: debits == credits; a PAID order has exactly one CASH debit and one
+    REVENUE credit for its amount; reversals never exceed the payment; orders
+    that aren't PAID have no entries
+
+The order space is cut into contiguous order_id ranges (UUIDv4 ids are uniform,
+so ranges are even and each one is an index range scan). Ranges are checked in
+parallel, one connection per worker, and every finished range is written to a
+JSON checkpoint: an interrupted run picks up from the remaining ranges instead
+of rescanning. On a fresh run all workers read the same exported snapshot, so a
+live ledger is checked as of one point in time.
+"""
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter as Tally, defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app.metrics import reconciliation_duration, reconciliation_discrepancies
+
+log = logging.getLogger(__name__)
+
+# Every check the report can count, so the gauges drop back to 0 once fixed
+CHECKS = (
+    "global_unbalanced",
+    "currency_unbalanced",
+    "account_rollup_mismatch",
+    "order_unbalanced",
+    "refund_exceeds_payment",
+    "paid_without_one_payment",
+    "unpaid_with_entries",
+)
+
+_SNAPSHOT_RE = re.compile(r"^[0-9A-F]+-[0-9A-F]+(-[0-9]+)?$")
+
+_RANGE = "{col} >= CAST(:lo AS uuid) AND (CAST(:hi AS uuid) IS NULL OR {col} < CAST(:hi AS uuid))"
+
+_TOTALS_SQL = text(f"""
+    SELECT o.currency, l.account, count(*) AS entries,
+           sum(l.debit_cents) AS debits, sum(l.credit_cents) AS credits
+    FROM ledger_lines l JOIN orders o ON o.id = l.order_id
+    WHERE {_RANGE.format(col="l.order_id")}
+    GROUP BY o.currency, l.account
+""")
+
+_ORDERS_SQL = text(f"SELECT count(*) FROM orders WHERE {_RANGE.format(col='id')}")
+
+# First matching problem per order; only offending orders come back
+_ORDER_CHECKS_SQL = text(f"""
+    WITH l AS (
+        SELECT order_id,
+               sum(debit_cents) AS debits,
+               sum(credit_cents) AS credits,
+               count(*) FILTER (WHERE account = 'CASH' AND debit_cents > 0) AS payments,
+               count(*) FILTER (WHERE account = 'REVENUE' AND credit_cents > 0) AS revenues,
+               coalesce(sum(debit_cents) FILTER (WHERE account = 'CASH'), 0) AS cash_dr,
+               coalesce(sum(credit_cents) FILTER (WHERE account = 'CASH'), 0) AS cash_cr,
+               coalesce(sum(debit_cents) FILTER (WHERE account = 'REVENUE'), 0) AS rev_dr,
+               coalesce(sum(credit_cents) FILTER (WHERE account = 'REVENUE'), 0) AS rev_cr
+        FROM ledger_lines
+        WHERE {_RANGE.format(col="order_id")}
+        GROUP BY order_id
+    ), checked AS (
+        SELECT o.id, CASE
+            WHEN l.debits <> l.credits THEN 'order_unbalanced'
+            WHEN l.cash_cr > l.cash_dr OR l.rev_dr > l.rev_cr THEN 'refund_exceeds_payment'
+            WHEN o.status = 'PAID' AND (
+                l.order_id IS NULL OR l.payments <> 1 OR l.revenues <> 1
+                OR l.cash_dr <> o.amount_cents OR l.rev_cr <> o.amount_cents
+            ) THEN 'paid_without_one_payment'
+            WHEN o.status <> 'PAID' AND l.order_id IS NOT NULL THEN 'unpaid_with_entries'
+        END AS problem
+        FROM orders o LEFT JOIN l ON l.order_id = o.id
+        WHERE {_RANGE.format(col="o.id")}
+    )
+    SELECT id, problem FROM checked WHERE problem IS NOT NULL ORDER BY id
+""")
+
+_ROLLUP_SQL = text("""
+    SELECT account, currency, sum(debit_cents) AS debits, sum(credit_cents) AS credits
+    FROM account_balances GROUP BY account, currency
+""")
+
+
+def order_ranges(n: int) -> List[Tuple[str, Optional[str]]]:
+    """`n` contiguous [lo, hi) order_id ranges covering the whole UUID space (last hi is open)."""
+    bounds = [str(UUID(int=i * (1 << 128) // n)) for i in range(n)]
+    return [(lo, bounds[i + 1] if i + 1 < n else None) for i, lo in enumerate(bounds)]
+
+
+def check_range(conn: Connection, lo: str, hi: Optional[str], sample_limit: int) -> Dict:
+    """Totals + per-order problems for one range (JSON-serialisable, goes into the checkpoint)."""
+    params = {"lo": lo, "hi": hi}
+    totals = [
+        [r.currency, r.account, r.entries, int(r.debits), int(r.credits)]
+        for r in conn.execute(_TOTALS_SQL, params)
+    ]
+    problems: Tally = Tally()
+    samples = []
+    for order_id, problem in conn.execute(_ORDER_CHECKS_SQL, params):
+        problems[problem] += 1
+        if len(samples) < sample_limit:
+            samples.append({"order_id": str(order_id), "problem": problem})
+    return {
+        "orders": conn.execute(_ORDERS_SQL, params).scalar_one(),
+        "totals": totals,
+        "problems": dict(problems),
+        "samples": samples,
+    }
+
+
+def _check_range_in_snapshot(
+    engine: Engine, snapshot: Optional[str], lo: str, hi: Optional[str], sample_limit: int,
+) -> Dict:
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            if snapshot:
+                # Must be the transaction's first statement; the id came from pg_export_snapshot()
+                conn.exec_driver_sql(f"SET TRANSACTION SNAPSHOT '{snapshot}'")
+            return check_range(conn, lo, hi, sample_limit)
+
+
+def _load_checkpoint(path: Optional[str], ranges: int) -> Dict[str, Dict]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        state = json.load(f)
+    if state.get("ranges") != ranges:
+        log.warning("ignoring checkpoint %s: it was made with %s ranges, not %d", path, state.get("ranges"), ranges)
+        return {}
+    return state["done"]
+
+
+def _save_checkpoint(path: Optional[str], ranges: int, done: Dict[str, Dict]) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"ranges": ranges, "done": done}, f)
+    os.replace(tmp, path)  # atomic: a crash leaves the previous checkpoint intact
+
+
+def reconcile(
+    engine: Engine,
+    ranges: int = 64,
+    workers: int = 4,
+    checkpoint: Optional[str] = None,
+    sample_limit: int = 20,
+) -> Dict:
+    """
+    Run every check and return the report:
+      {"ok", "ranges", "resumed_ranges", "orders", "entries", "duration_secs",
+       "discrepancies": {check: count}, "mismatches": [first `sample_limit` offenders]}
+    The checkpoint file is removed after a complete run.
+    """
+    start = perf_counter()
+    done = _load_checkpoint(checkpoint, ranges)
+    resumed = len(done)
+    pending = [(str(i), lo, hi) for i, (lo, hi) in enumerate(order_ranges(ranges)) if str(i) not in done]
+
+    with engine.connect() as coordinator:
+        coordinator = coordinator.execution_options(isolation_level="REPEATABLE READ")
+        with coordinator.begin():
+            # Workers join this transaction's snapshot, so ranges and the rollup agree.
+            # A resumed run mixes snapshots; the rollup comparison is then best effort.
+            snapshot = coordinator.execute(text("SELECT pg_export_snapshot()")).scalar_one()
+            if not _SNAPSHOT_RE.match(snapshot):
+                snapshot = None
+
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="reconcile") as pool:
+                futures = {
+                    pool.submit(_check_range_in_snapshot, engine, snapshot, lo, hi, sample_limit): i
+                    for i, lo, hi in pending
+                }
+                for future in as_completed(futures):
+                    done[futures[future]] = future.result()
+                    _save_checkpoint(checkpoint, ranges, done)
+
+            rollup = {
+                (r.account, r.currency): (int(r.debits), int(r.credits))
+                for r in coordinator.execute(_ROLLUP_SQL)
+            }
+
+    report = summarize(done.values(), rollup, sample_limit)
+    report.update(ranges=ranges, resumed_ranges=resumed, duration_secs=round(perf_counter() - start, 3))
+
+    reconciliation_duration.set(report["duration_secs"])
+    for check in CHECKS:
+        reconciliation_discrepancies.labels(check).set(report["discrepancies"].get(check, 0))
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return report
+
+
+def summarize(parts, rollup: Dict[Tuple[str, str], Tuple[int, int]], sample_limit: int) -> Dict:
+    """Fold per-range results into the report and run the global / currency / account checks."""
+    orders = entries = 0
+    problems: Tally = Tally()
+    mismatches: List[Dict] = []
+    by_account: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0, 0])
+    for part in parts:
+        orders += part["orders"]
+        entries += sum(t[2] for t in part["totals"])
+        problems.update(part["problems"])
+        mismatches.extend(part["samples"])
+        for currency, account, _, debits, credits in part["totals"]:
+            totals = by_account[(account, currency)]
+            totals[0] += debits
+            totals[1] += credits
+
+    debits = sum(t[0] for t in by_account.values())
+    credits = sum(t[1] for t in by_account.values())
+    if debits != credits:
+        problems["global_unbalanced"] += 1
+        mismatches.append({"check": "global_unbalanced", "debits": debits, "credits": credits})
+
+    per_currency: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for (account, currency), (dr, cr) in by_account.items():
+        per_currency[currency][0] += dr
+        per_currency[currency][1] += cr
+    for currency, (dr, cr) in sorted(per_currency.items()):
+        if dr != cr:
+            problems["currency_unbalanced"] += 1
+            mismatches.append({"check": "currency_unbalanced", "currency": currency, "debits": dr, "credits": cr})
+
+    for account, currency in sorted(set(by_account) | set(rollup)):
+        ledger = tuple(by_account.get((account, currency), (0, 0)))
+        rolled = rollup.get((account, currency), (0, 0))
+        if ledger != rolled:
+            problems["account_rollup_mismatch"] += 1
+            mismatches.append({
+                "check": "account_rollup_mismatch", "account": account, "currency": currency,
+                "ledger": list(ledger), "rollup": list(rolled),
+            })
+
+    return {
+        "ok": not problems,
+        "orders": orders,
+        "entries": entries,
+        "discrepancies": dict(problems),
+        "mismatches": mismatches[:sample_limit],
+    }
@@ -1,107 +1,84 @@
 # app/services/refunds.py
-from datetime import datetime, timezone, timedelta
 from time import perf_counter
-from typing import Tuple, Dict
+from typing import TYPE_CHECKING, Tuple, Dict, Optional
 from uuid import UUID
 
 from fastapi import HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from app.models import Order, OrderStatus, LedgerEntry, IdempotencyKey
-from app.metrics import (
-    refunds_total, idempotency_hits, idempotency_conflicts,
-    inflight_retries, refund_errors, refund_latency
-)
+from app.models import Order, OrderStatus
+from app.services.idempotency import run_idempotent
+from app.services.balances import apply_ledger_rows
+from app.services.journal import write_ledger_rows
+from app.services.orders import touch
+from app.phases import phase
+from app.metrics import refunds_total, refund_errors, refund_latency
 
-LOCK_WINDOW_SECS = 15
+if TYPE_CHECKING:  # the async stack is only imported when ASYNC_DB=true
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.services.group_commit import LedgerWrites
 
 
-def refund_order_idempotent(db: Session, order_id: UUID, idem_key: str) -> Tuple[int, Dict]:
+def _refund(db: Session, order_id: UUID, writes: Optional["LedgerWrites"] = None) -> Dict:
     """
-    Full refund flow (idempotent):
+    Lock the order row, require PAID, write reversing entries: DR REVENUE, CR CASH.
+    With `writes` (group commit) the rows are recorded there instead.
+    """
+    with phase("refund", "lock_order"):
+        order = db.execute(
+            select(Order).where(Order.id == order_id).with_for_update()
+        ).scalar_one_or_none()
+
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+
+    status = writes.status(order) if writes is not None else order.status
+    if status != OrderStatus.PAID:
+        # MVP: only allow refund of PAID orders (we're not flipping status here)
+        raise HTTPException(status_code=400, detail="Order not in PAID state")
+
+    # Reverse original entries: DR REVENUE, CR CASH
+    rows = [
+        {"order_id": order.id, "account": "REVENUE", "debit_cents": order.amount_cents, "credit_cents": 0},
+        {"order_id": order.id, "account": "CASH", "debit_cents": 0, "credit_cents": order.amount_cents},
+    ]
+    with phase("refund", "ledger_write"):
+        if writes is not None:
+            writes.record(order, rows)
+        else:
+            write_ledger_rows(db, rows)
+            apply_ledger_rows(db, rows, {order.id: (order.user_id, order.currency)})
+            touch(order)
+            db.flush()  # the UPDATE runs here, not in COMMIT
+    return {"order_id": str(order.id), "refunded": True}
+
+
+def refund_order_idempotent(db: Session, order_id: UUID, idem_key: str) -> Tuple[int, bytes, str]:
+    """
+    Full refund flow (idempotent, see app/services/idempotency.py for the protocol):
       - Bind Idempotency-Key to THIS request via fingerprint (method + path + order_id)
       - If cached response exists -> return it (with legacy binding check)
+        * Checked in the in-process response cache first, then in Postgres
       - If in-flight -> 425 Too Early
-      - Else do one atomic transaction:
+      - Else ONE transaction (single commit):
+          * claim the key
           * lock order row, require PAID
           * write reversing entries: DR REVENUE, CR CASH
-      - Cache response under the key
-    Returns: (status_code, response_json)
+          * store the response under the key
+    Returns: (status_code, response bytes, content_type); replays return the stored bytes verbatim
     """
     start = perf_counter()
-    now = datetime.now(timezone.utc)
     fingerprint = f"POST:/orders/{order_id}/refund"
 
     try:
-        row = db.get(IdempotencyKey, idem_key)
-
-        # Key used for a different request? -> 409
-        if row and row.request_fingerprint and row.request_fingerprint != fingerprint:
-            idempotency_conflicts.labels("refund").inc()
-            raise HTTPException(status_code=409, detail="Idempotency-Key was used for a different request")
-
-        # Completed response cached?
-        if row and row.response_body is not None:
-            if not row.request_fingerprint:
-                cached_order = row.response_body.get("order_id")
-                if cached_order and str(cached_order) != str(order_id):
-                    idempotency_conflicts.labels("refund").inc()
-                    raise HTTPException(status_code=409, detail="Idempotency-Key was used for a different request")
-                row.request_fingerprint = fingerprint
-                db.commit()
-            idempotency_hits.labels("refund").inc()
-            return (row.status_code or 200, row.response_body)
-
-        # In-flight?
-        if row and row.locked_until and row.locked_until > now:
-            inflight_retries.labels("refund").inc()
-            raise HTTPException(status_code=425, detail="Request in flight; retry shortly")
-
-        # Set short in-flight lock + fingerprint
-        lock_until = now + timedelta(seconds=LOCK_WINDOW_SECS)
-        if not row:
-            row = IdempotencyKey(key=idem_key, request_fingerprint=fingerprint, locked_until=lock_until)
-            db.add(row)
-        else:
-            if not row.request_fingerprint:
-                row.request_fingerprint = fingerprint
-            row.locked_until = lock_until
-        db.commit()
-
-        # Do the refund atomically
-        with db.begin():
-            order = db.execute(
-                select(Order).where(Order.id == order_id).with_for_update()
-            ).scalar_one_or_none()
-
-            if not order:
-                raise HTTPException(status_code=404, detail="Order not found")
-
-            if order.status != OrderStatus.PAID:
-                # MVP: only allow refund of PAID orders (we're not flipping status here)
-                raise HTTPException(status_code=400, detail="Order not in PAID state")
-
-            # Reverse original entries: DR REVENUE, CR CASH
-            db.add(LedgerEntry(
-                order_id=order.id, account="REVENUE",
-                debit_cents=order.amount_cents, credit_cents=0
-            ))
-            db.add(LedgerEntry(
-                order_id=order.id, account="CASH",
-                debit_cents=0, credit_cents=order.amount_cents
-            ))
-
-            resp = {"order_id": str(order.id), "refunded": True}
-
-        # Cache response and clear lock
-        row.status_code = 200
-        row.response_body = resp
-        row.locked_until = None
-        db.commit()
-
-        refunds_total.inc()
-        return (200, resp)
+        result = run_idempotent(
+            db, "refund", idem_key, fingerprint,
+            lambda s, writes=None: _refund(s, order_id, writes), order_id=order_id,
+        )
+        if not result.replayed:
+            refunds_total.inc()
+        return (result.status_code, result.body, result.content_type)
 
     except HTTPException as e:
         kind = "409_conflict" if e.status_code == 409 else (
@@ -111,3 +88,13 @@ def refund_order_idempotent(db: Session, order_id: UUID, idem_key: str) -> Tuple
         raise
     finally:
         refund_latency.observe(perf_counter() - start)
+
+
+async def refund_order_idempotent_async(
+    db: "AsyncSession", order_id: UUID, idem_key: str,
+) -> Tuple[int, bytes, str]:
+    """
+    Async flavour of refund_order_idempotent for the async engine.
+    Runs the exact same protocol through AsyncSession.run_sync (greenlet, no thread).
+    """
+    return await db.run_sync(refund_order_idempotent, order_id, idem_key)
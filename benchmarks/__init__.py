@@ -0,0 +1,10 @@
+# benchmarks/__init__.py
+"""
+Load and micro benchmarks for the pay / refund / idempotency paths.
+
+    python -m benchmarks.load --scenario unique_keys --concurrency 32 --requests 2000 --out load.json
+    python -m benchmarks.micro --iterations 500 --out micro.json
+
+Both write a JSON report (git commit, config, req/s, p50/p95/p99 per operation)
+so runs can be compared across commits.
+"""
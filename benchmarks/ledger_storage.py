@@ -0,0 +1,111 @@
+# benchmarks/ledger_storage.py
+"""
+Ledger representation benchmark: write the same payments as ledger_entries rows
+and as journal_transactions + postings, and compare insert throughput, heap bytes
+per posting and index bytes per posting (size deltas, so run on a scratch database).
+
+    python -m benchmarks.ledger_storage --payments 20000 --batch 100 --out storage.json
+"""
+import argparse
+import random
+from time import perf_counter
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from app.db import SessionLocal, engine
+from app.migrations import migrate
+from app.services.journal import write_ledger_rows
+from app.services.orders import create_orders_batch
+from benchmarks.stats import Recorder, emit, report
+
+# Tables behind each model; partitions (if any) are included via pg_partition_tree
+TABLES = {"entries": ["ledger_entries"], "journal": ["journal_transactions", "postings"]}
+
+_SIZES_SQL = text("""
+    SELECT coalesce(sum(pg_relation_size(relid)), 0) AS heap,
+           coalesce(sum(pg_indexes_size(relid)), 0) AS indexes
+    FROM (
+        SELECT CAST(:table AS regclass) AS relid
+        UNION SELECT relid FROM pg_partition_tree(CAST(:table AS regclass))
+    ) t
+""")
+
+
+def _sizes(model: str) -> Dict[str, int]:
+    with engine.connect() as conn:
+        rows = [conn.execute(_SIZES_SQL, {"table": t}).one() for t in TABLES[model]]
+    return {"heap": sum(int(r.heap) for r in rows), "indexes": sum(int(r.indexes) for r in rows)}
+
+
+def _payment_rows(n: int) -> List[Dict]:
+    items = [
+        {"user_id": str(uuid4()), "amount_cents": random.randint(100, 100_000), "currency": "USD"}
+        for _ in range(n)
+    ]
+    with SessionLocal() as db:
+        orders = [r["order"] for r in create_orders_batch(db, items)]
+    rows = []
+    for o in orders:
+        rows.append({"order_id": o["id"], "account": "CASH", "debit_cents": o["amount_cents"], "credit_cents": 0})
+        rows.append({"order_id": o["id"], "account": "REVENUE", "debit_cents": 0, "credit_cents": o["amount_cents"]})
+    return rows
+
+
+def _run_model(model: str, rows: List[Dict], batch: int) -> Tuple[Dict, Dict]:
+    rec = Recorder()
+    before = _sizes(model)
+    step = batch * 2  # two postings per payment
+    start = perf_counter()
+    for i in range(0, len(rows), step):
+        t = perf_counter()
+        with SessionLocal() as db, db.begin():
+            write_ledger_rows(db, rows[i:i + step], model)
+        rec.record("insert_batch", perf_counter() - t)
+    duration = perf_counter() - start
+    after = _sizes(model)
+
+    return rec.summary(duration), {
+        "postings": len(rows),
+        "postings_per_s": round(len(rows) / duration, 1) if duration > 0 else 0.0,
+        "heap_bytes_per_posting": round((after["heap"] - before["heap"]) / len(rows), 1),
+        "index_bytes_per_posting": round((after["indexes"] - before["indexes"]) / len(rows), 1),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    migrate(engine)
+    started = perf_counter()
+    results, storage = {}, {}
+    for model in ("entries", "journal"):
+        results[model], storage[model] = _run_model(model, _payment_rows(args.payments), args.batch)
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    data = report("ledger_storage", config, perf_counter() - started, results)
+    data["storage"] = storage
+    return data
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.ledger_storage", description=__doc__.split("\n\n")[0],
+    )
+    parser.add_argument("--payments", type=int, default=20_000, help="payments (2 postings each) per model")
+    parser.add_argument("--batch", type=int, default=100, help="payments per insert transaction")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    data = run(args)
+    emit(data, args.out)
+    for model, s in data["storage"].items():
+        print(
+            f"{model:>16} {s['postings_per_s']:>9.1f} postings/s "
+            f"heap={s['heap_bytes_per_posting']} B/posting index={s['index_bytes_per_posting']} B/posting"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/load.py
+"""
+HTTP load harness. Start the API first (uvicorn or `docker compose up`), then:
+
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --scenario all --concurrency 32 --requests 2000
+
+Each scenario creates the orders it needs up front through the batch endpoints
+(untimed), then fires its requests from `concurrency` workers and records every
+request's latency and status code.
+"""
+import argparse
+import asyncio
+import random
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.stats import Recorder, emit, report
+
+SETUP_CHUNK = 1000  # orders per /orders:batch or /payments:batch call during setup
+
+
+class Job(NamedTuple):
+    op: str
+    method: str
+    path: str
+    headers: Optional[Dict[str, str]] = None
+    json: Optional[Dict] = None
+
+
+def _order_body() -> Dict:
+    return {"user_id": str(uuid4()), "amount_cents": random.randint(100, 100_000), "currency": "USD"}
+
+
+def _pay(order_id: str, key: Optional[str] = None, op: str = "pay") -> Job:
+    return Job(op, "POST", f"/orders/{order_id}/pay", {"Idempotency-Key": key or str(uuid4())})
+
+
+def _refund(order_id: str) -> Job:
+    return Job("refund", "POST", f"/orders/{order_id}/refund", {"Idempotency-Key": str(uuid4())})
+
+
+async def _create_orders(client: httpx.AsyncClient, n: int) -> List[str]:
+    ids: List[str] = []
+    for start in range(0, n, SETUP_CHUNK):
+        body = {"orders": [_order_body() for _ in range(min(SETUP_CHUNK, n - start))]}
+        r = await client.post("/orders:batch", json=body)
+        r.raise_for_status()
+        ids.extend(item["order"]["id"] for item in r.json()["results"])
+    return ids
+
+
+async def _paid_orders(client: httpx.AsyncClient, n: int) -> List[str]:
+    ids = await _create_orders(client, n)
+    for start in range(0, n, SETUP_CHUNK):
+        items = [{"order_id": i, "idempotency_key": str(uuid4())} for i in ids[start:start + SETUP_CHUNK]]
+        r = await client.post("/payments:batch", json={"items": items})
+        r.raise_for_status()
+    return ids
+
+
+# --- scenarios: (client, args) -> jobs ---------------------------------------------
+
+async def create_orders(client, args) -> List[Job]:
+    return [Job("create_order", "POST", "/orders", json=_order_body()) for _ in range(args.requests)]
+
+
+async def unique_keys(client, args) -> List[Job]:
+    """Every request pays a different order with a fresh key: the happy path."""
+    return [_pay(i) for i in await _create_orders(client, args.requests)]
+
+
+async def refunds(client, args) -> List[Job]:
+    return [_refund(i) for i in await _paid_orders(client, args.requests)]
+
+
+async def duplicate_storm(client, args) -> List[Job]:
+    """
+    Clients retrying aggressively: each order is paid `--retries` times with the SAME
+    key, back to back, so the copies overlap in flight (425 / wait / replay paths).
+    """
+    ids = await _create_orders(client, max(1, args.requests // args.retries))
+    return [_pay(i, key=f"storm-{i}") for i in ids for _ in range(args.retries)]
+
+
+async def hot_order(client, args) -> List[Job]:
+    """Every request pays the SAME order with a different key: row-lock contention."""
+    (order_id,) = await _create_orders(client, 1)
+    return [_pay(order_id) for _ in range(args.requests)]
+
+
+async def mixed(client, args) -> List[Job]:
+    """`--read-ratio` of requests read order/ledger data, the rest pay or refund."""
+    writes = int(args.requests * (1 - args.read_ratio))
+    pending = await _create_orders(client, writes // 2 + 1)
+    paid = await _paid_orders(client, max(1, writes - writes // 2))
+    jobs = [_pay(i) for i in pending[:writes // 2]] + [_refund(i) for i in paid[:writes - writes // 2]]
+    reads = [
+        ("get_order", "/orders/{}"), ("ledger", "/orders/{}/ledger"),
+        ("ledger_summary", "/orders/{}/ledger/summary"), ("ledger_page", "/orders/{}/ledger/page?limit=10"),
+    ]
+    for n in range(args.requests - len(jobs)):
+        op, path = reads[n % len(reads)]
+        jobs.append(Job(op, "GET", path.format(random.choice(paid))))
+    random.shuffle(jobs)
+    return jobs
+
+
+SCENARIOS: Dict[str, Callable[[httpx.AsyncClient, argparse.Namespace], Awaitable[List[Job]]]] = {
+    "create_orders": create_orders,
+    "unique_keys": unique_keys,
+    "refunds": refunds,
+    "duplicate_storm": duplicate_storm,
+    "hot_order": hot_order,
+    "mixed": mixed,
+}
+
+
+async def _fire(client: httpx.AsyncClient, jobs: List[Job], concurrency: int, rec: Recorder) -> float:
+    queue: asyncio.Queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def worker():
+        while True:
+            try:
+                job = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = perf_counter()
+            try:
+                r = await client.request(job.method, job.path, headers=job.headers, json=job.json)
+                status = r.status_code
+            except httpx.HTTPError:
+                status = "error"
+            rec.record(job.op, perf_counter() - start, status)
+
+    start = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results, total = {}, 0.0
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        for name in names:
+            jobs = await SCENARIOS[name](client, args)
+            rec = Recorder()
+            duration = await _fire(client, jobs, args.concurrency, rec)
+            results[name] = rec.summary(duration)
+            total += duration
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    return report("load", config, total, results)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenario", choices=["all", *SCENARIOS], default="all")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--retries", type=int, default=20, help="copies per key in duplicate_storm")
+    parser.add_argument("--read-ratio", type=float, default=0.8, help="share of reads in mixed")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    emit(asyncio.run(run(args)), args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/micro.py
+"""
+Service-level microbenchmarks: call pay_order_idempotent / refund_order_idempotent
+directly on SessionLocal sessions (no HTTP, no JSON encoding), against DATABASE_URL.
+
+    python -m benchmarks.micro --iterations 500 --threads 1 --out micro.json
+"""
+import argparse
+import random
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException
+
+from app.db import SessionLocal, engine
+from app.migrations import migrate
+from app.services.idempotency_cache import response_cache
+from app.services.orders import create_orders_batch
+from app.services.payments import pay_order_idempotent
+from app.services.refunds import refund_order_idempotent
+from benchmarks.stats import Recorder, emit, report
+
+Call = Tuple[UUID, str]  # (order_id, idempotency key)
+
+
+def _new_orders(n: int) -> List[UUID]:
+    items = [
+        {"user_id": str(uuid4()), "amount_cents": random.randint(100, 100_000), "currency": "USD"}
+        for _ in range(n)
+    ]
+    with SessionLocal() as db:
+        return [r["order"]["id"] for r in create_orders_batch(db, items)]
+
+
+def _time(op: str, fn: Callable, calls: List[Call], threads: int) -> Dict:
+    rec = Recorder()
+
+    def one(call: Call) -> None:
+        start = perf_counter()
+        try:
+            with SessionLocal() as db:
+                status, _, _ = fn(db, *call)
+        except HTTPException as e:
+            status = e.status_code
+        rec.record(op, perf_counter() - start, status)
+
+    start = perf_counter()
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(one, calls))
+    else:
+        for call in calls:
+            one(call)
+    return rec.summary(perf_counter() - start)
+
+
+def run(args: argparse.Namespace) -> Dict:
+    migrate(engine)
+    n, threads = args.iterations, args.threads
+    pays = [(order_id, str(uuid4())) for order_id in _new_orders(n)]
+    refunds = [(order_id, str(uuid4())) for order_id, _ in pays]
+
+    started = perf_counter()
+    results = {"pay_fresh": _time("pay", pay_order_idempotent, pays, threads)}
+    # Same keys again: served from the in-process cache, then (cache cleared) from Postgres
+    results["pay_replay_cache"] = _time("pay", pay_order_idempotent, pays, threads)
+    response_cache.clear()
+    results["pay_replay_db"] = _time("pay", pay_order_idempotent, pays, threads)
+    results["refund_fresh"] = _time("refund", refund_order_idempotent, refunds, threads)
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    return report("micro", config, perf_counter() - started, results)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=500, help="orders paid/refunded per benchmark")
+    parser.add_argument("--threads", type=int, default=1, help="concurrent callers (one session each)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    emit(run(args), args.out)
+
+
+if __name__ == "__main__":
+    main()
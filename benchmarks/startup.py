@@ -0,0 +1,113 @@
+# benchmarks/startup.py
+"""
+Cold-start benchmark: import time of app.main (from `python -X importtime`) and
+time from process spawn to the first successful GET /healthz under uvicorn.
+
+    python -m benchmarks.startup --runs 5 --startup-mode verify --budget-ms 3000 --out startup.json
+
+Exits non-zero when the median time-to-first-request is over --budget-ms, so it
+can gate CI.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+from collections import defaultdict
+from time import perf_counter, sleep
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.stats import Recorder, emit, percentile, report
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_profile(env: Dict[str, str]) -> Tuple[float, Dict[str, float]]:
+    """Cumulative import time of app.main and of each top-level package it pulls in (seconds)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    total, packages, children = 0.0, {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        # Children are printed before their parent, one extra indent level deeper
+        depth, name = len(raw_name) - len(raw_name.lstrip()), raw_name.strip()
+        if depth == 3:
+            children[name] = int(cumulative) / 1e6
+        elif depth == 1:
+            if name == "app.main":
+                total, packages = int(cumulative) / 1e6, children
+            children = {}
+    return total, packages
+
+
+def first_request(env: Dict[str, str], timeout: float) -> float:
+    """Seconds from spawning uvicorn to the first 200 from /healthz."""
+    port = _free_port()
+    start = perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/healthz", timeout=1.0).status_code == 200:
+                    return perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode} during startup")
+            sleep(0.01)
+        raise TimeoutError(f"no response from /healthz within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--startup-mode", choices=["migrate", "verify"], default="verify")
+    parser.add_argument("--pool-warm", type=int, default=0, help="DB_POOL_WARM for the spawned app")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--budget-ms", type=float, help="fail if median time-to-first-request exceeds this")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    env = {**os.environ, "STARTUP_MODE": args.startup_mode, "DB_POOL_WARM": str(args.pool_warm)}
+    rec = Recorder()
+    packages: Dict[str, List[float]] = defaultdict(list)
+    started = perf_counter()
+    for _ in range(args.runs):
+        total, per_package = import_profile(env)
+        rec.record("import_app", total)
+        for name, seconds in per_package.items():
+            packages[name].append(seconds)
+        rec.record("first_request", first_request(env, args.timeout))
+    duration = perf_counter() - started
+
+    data = report("startup", {k: v for k, v in vars(args).items() if k != "out"}, duration, {"startup": rec.summary(duration, total=False)})
+    slowest = sorted(((percentile(sorted(v), 50), k) for k, v in packages.items()), reverse=True)[:15]
+    data["imports_p50_ms"] = {name: round(seconds * 1000, 3) for seconds, name in slowest}
+    emit(data, args.out)
+
+    p50 = data["results"]["startup"]["first_request"]["p50_ms"]
+    if args.budget_ms is not None and p50 > args.budget_ms:
+        print(f"time-to-first-request p50 {p50:.0f}ms is over the {args.budget_ms:.0f}ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/stats.py
+import json
+import platform
+import subprocess
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Latencies (seconds) and status codes per operation name."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, op: str, seconds: float, status: int | str = 200) -> None:
+        self.latencies[op].append(seconds)
+        self.statuses[op][str(status)] += 1
+
+    def summary(self, duration: float, total: bool = True) -> Dict[str, Dict]:
+        ops = {}
+        everything: List[float] = []
+        for op, values in sorted(self.latencies.items()):
+            everything.extend(values)
+            ops[op] = _summarise(sorted(values), duration, dict(self.statuses[op]))
+        if total and len(ops) > 1:
+            ops["total"] = _summarise(sorted(everything), duration, {})
+        return ops
+
+
+def _summarise(values: List[float], duration: float, statuses: Dict[str, int]) -> Dict:
+    ms = lambda s: round(s * 1000, 3)  # noqa: E731
+    return {
+        "count": len(values),
+        "rps": round(len(values) / duration, 1) if duration > 0 else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+        "statuses": statuses,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(kind: str, config: Dict, duration: float, results: Dict) -> Dict:
+    return {
+        "kind": kind,
+        "git_commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": config,
+        "duration_s": round(duration, 3),
+        "results": results,
+    }
+
+
+def emit(data: Dict, out: Optional[str]) -> None:
+    """Write the report to `out` (if given) and print a one-line-per-op table."""
+    if out:
+        with open(out, "w") as f:
+            json.dump(data, f, indent=2)
+    for name, ops in data["results"].items():
+        for op, s in ops.items():
+            print(
+                f"{name:>16} {op:<18} n={s['count']:<6} {s['rps']:>9.1f} req/s "
+                f"p50={s['p50_ms']:.2f}ms p95={s['p95_ms']:.2f}ms p99={s['p99_ms']:.2f}ms"
+            )
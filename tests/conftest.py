@@ -12,16 +12,19 @@ os.environ.setdefault(
 from app.main import app  # noqa
 from app.db import engine  # <-- engine is here
 from app.models import Base  # tables metadata
+from app.services.idempotency_cache import response_cache
 
 @pytest.fixture(autouse=True)
 def create_schema_and_clean_db():
     # Ensure tables exist (startup also does this, but be explicit for tests)
     Base.metadata.create_all(bind=engine)
     # Truncate between tests so they don't interfere
+    # accounts is reference data seeded with the table
+    tables = ", ".join(t.name for t in Base.metadata.sorted_tables if t.name != "accounts")
     with engine.begin() as conn:
-        conn.exec_driver_sql(
-            "TRUNCATE TABLE ledger_entries, orders, idempotency_keys RESTART IDENTITY CASCADE;"
-        )
+        conn.exec_driver_sql(f"TRUNCATE TABLE {tables} RESTART IDENTITY CASCADE;")
+    # Cached responses point at rows we just truncated
+    response_cache.clear()
     yield
 
 @pytest.fixture
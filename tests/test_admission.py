@@ -0,0 +1,75 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app import admission
+from app.admission import READ, WRITE, AdmissionController
+from app.config import settings
+from app.db import engine
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 250, "currency": "USD"}
+
+
+def _controller(capacity=1, limits=None, queue=8, timeout=1.0):
+    return AdmissionController(capacity, limits or {}, {WRITE: queue, READ: queue}, timeout)
+
+
+@pytest.mark.asyncio
+async def test_writes_are_admitted_before_reads():
+    c = _controller()
+    await c.acquire("ledger", READ)  # holds the only slot
+    order = []
+
+    async def request(endpoint, priority):
+        await c.acquire(endpoint, priority)
+        order.append(endpoint)
+        c.release(endpoint)
+
+    tasks = [asyncio.create_task(request("ledger_summary", READ))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("pay", WRITE)))  # queued later, served first
+    await asyncio.sleep(0)
+    c.release("ledger")
+    await asyncio.gather(*tasks)
+    assert order == ["pay", "ledger_summary"]
+    assert c.in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_endpoint_limit_and_shedding():
+    c = _controller(capacity=3, limits={"ledger": 1}, queue=1, timeout=0.05)
+    await c.acquire("ledger", READ)
+    await c.acquire("pay", WRITE)  # other endpoints still get in
+
+    with pytest.raises(HTTPException) as e:  # waits past the queue timeout
+        await c.acquire("ledger", READ)
+    assert e.value.status_code == 503 and e.value.headers["Retry-After"] == str(settings.admission_retry_after_secs)
+
+    waiter = asyncio.create_task(c.acquire("ledger", READ))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException):  # queue of 1 is full: shed at once
+        await c.acquire("ledger", READ)
+    c.release("ledger")
+    await waiter
+    assert c.in_use == 2
+
+
+def test_shed_before_the_idempotency_key_is_claimed(client, monkeypatch):
+    order = client.post("/orders", json=BODY).json()
+    c = _controller(queue=0)
+    c.in_use = c.capacity  # pool is saturated
+    monkeypatch.setattr(settings, "admission_enabled", True)
+    monkeypatch.setattr(admission, "controller", c)
+
+    r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "adm-1"})
+    assert r.status_code == 503 and r.headers["Retry-After"] == str(settings.admission_retry_after_secs)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM idempotency_keys")).scalar() == 0
+
+    c.in_use = 0
+    r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "adm-1"})
+    assert r.status_code == 200
+    assert c.in_use == 0  # slot released after the response
@@ -0,0 +1,38 @@
+# tests/test_async_mode.py
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.async_routes import router
+from app.db_async import async_engine
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 600, "currency": "USD"}
+
+
+@pytest.mark.asyncio
+async def test_async_handlers_pay_refund_and_read_ledger(client):
+    order_id = client.post("/orders", json=BODY).json()["id"]
+
+    # Same routes an ASYNC_DB=true deployment mounts in front of the sync ones
+    async_app = FastAPI()
+    async_app.include_router(router)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=async_app), base_url="http://test") as ac:
+            r1 = await ac.post(f"/orders/{order_id}/pay", headers={"Idempotency-Key": "apay"})
+            r2 = await ac.post(f"/orders/{order_id}/pay", headers={"Idempotency-Key": "apay"})
+            assert r1.status_code == r2.status_code == 200
+            assert r1.json() == r2.json() == {"order_id": order_id, "status": "PAID"}
+
+            r3 = await ac.post(f"/orders/{order_id}/refund", headers={"Idempotency-Key": "aref"})
+            assert r3.status_code == 200 and r3.json()["refunded"] is True
+
+            rows = (await ac.get(f"/orders/{order_id}/ledger")).json()
+            assert len(rows) == 4
+            summary = (await ac.get(f"/orders/{order_id}/ledger/summary")).json()
+            assert summary["total_debits"] == summary["total_credits"] == 1200
+
+            r4 = await ac.post(f"/orders/{order_id}/pay", headers={"Idempotency-Key": "aref"})
+            assert r4.status_code == 409
+    finally:
+        # async pool connections are bound to this test's event loop
+        await async_engine.dispose()
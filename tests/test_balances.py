@@ -0,0 +1,57 @@
+# tests/test_balances.py
+from sqlalchemy import text
+
+from app.db import SessionLocal, engine
+from app.migrations import migrate
+from app.services.balances import rebuild_balances
+
+USER = "00000000-0000-0000-0000-000000000002"
+
+
+def _snapshot(client, order_id):
+    return (
+        client.get(f"/orders/{order_id}/ledger/summary").json(),
+        client.get("/accounts/CASH/balance", params={"currency": "usd"}).json(),
+        client.get("/accounts/REVENUE/balance", params={"currency": "USD"}).json(),
+        client.get(f"/users/{USER}/balance", params={"currency": "USD"}).json(),
+    )
+
+
+def test_balances_follow_payments_and_refunds_and_rebuild_matches(client):
+    a = client.post("/orders", json={"user_id": USER, "amount_cents": 1000, "currency": "USD"}).json()
+    b = client.post("/orders", json={"user_id": USER, "amount_cents": 250, "currency": "USD"}).json()
+
+    client.post(f"/orders/{a['id']}/pay", headers={"Idempotency-Key": "p-a"})
+    client.post("/payments:batch", json={"items": [{"order_id": b["id"], "idempotency_key": "p-b"}]})
+    client.post(f"/orders/{a['id']}/refund", headers={"Idempotency-Key": "r-a"})
+
+    summary, cash, revenue, user = _snapshot(client, a["id"])
+    assert summary["total_debits"] == summary["total_credits"] == 2000
+    assert (cash["total_debits"], cash["total_credits"], cash["balance_cents"]) == (1250, 1000, 250)
+    assert (revenue["total_debits"], revenue["total_credits"], revenue["balance_cents"]) == (1000, 1250, 250)
+    assert (user["paid_cents"], user["refunded_cents"], user["net_cents"]) == (1250, 1000, 250)
+
+    # Recomputing from the raw ledger gives the same answers
+    with SessionLocal() as db:
+        rebuild_balances(db)
+    assert _snapshot(client, a["id"]) == (summary, cash, revenue, user)
+
+
+def test_unknown_user_balance_is_zero(client):
+    r = client.get(f"/users/{USER}/balance", params={"currency": "EUR"})
+    assert r.status_code == 200 and r.json()["net_cents"] == 0
+
+
+def test_upgrade_backfills_balances_for_existing_ledger(client):
+    a = client.post("/orders", json={"user_id": USER, "amount_cents": 700, "currency": "USD"}).json()
+    client.post(f"/orders/{a['id']}/pay", headers={"Idempotency-Key": "p-a"})
+    before = _snapshot(client, a["id"])
+
+    # A database upgraded from before the balance tables: ledger rows, empty rollups
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE order_balances, account_balances, user_balances"))
+        conn.execute(text("DELETE FROM schema_migrations WHERE version = 8"))
+    assert client.get(f"/orders/{a['id']}/ledger/summary").json()["total_debits"] == 0
+
+    assert migrate(engine) == [8]
+    assert _snapshot(client, a["id"]) == before
@@ -0,0 +1,39 @@
+# tests/test_checkout.py
+from sqlalchemy import text
+
+from app.db import engine
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 1500, "currency": "usd"}
+
+
+def _count(sql: str) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text(sql)).scalar_one()
+
+
+def test_checkout_creates_a_paid_order(client):
+    r = client.post("/checkout", json=BODY, headers={"Idempotency-Key": "co-1"})
+    assert r.status_code == 200
+    order = r.json()
+    assert order["status"] == "PAID" and order["currency"] == "USD" and order["amount_cents"] == 1500
+
+    assert client.get(f"/orders/{order['id']}").json()["status"] == "PAID"
+    ledger = client.get(f"/orders/{order['id']}/ledger").json()
+    assert sorted((e["account"], e["debit_cents"], e["credit_cents"]) for e in ledger) == [
+        ("CASH", 1500, 0), ("REVENUE", 0, 1500),
+    ]
+
+
+def test_checkout_replay_creates_nothing(client):
+    r1 = client.post("/checkout", json=BODY, headers={"Idempotency-Key": "co-2"})
+    r2 = client.post("/checkout", json=BODY, headers={"Idempotency-Key": "co-2"})
+    assert r1.content == r2.content
+    assert _count("SELECT count(*) FROM orders") == 1
+    assert _count("SELECT count(*) FROM ledger_lines") == 2
+
+
+def test_checkout_same_key_different_body_conflicts(client):
+    client.post("/checkout", json=BODY, headers={"Idempotency-Key": "co-3"})
+    r = client.post("/checkout", json={**BODY, "amount_cents": 1600}, headers={"Idempotency-Key": "co-3"})
+    assert r.status_code == 409
+    assert _count("SELECT count(*) FROM orders") == 1
@@ -0,0 +1,86 @@
+# tests/test_db_metrics.py
+import logging
+
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+
+from app.config import settings
+from app.db import TimedQueuePool, TimedReplicaQueuePool, instrument
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 800, "currency": "USD"}
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_statements_are_timed_per_endpoint(client):
+    order = client.post("/orders", json=BODY).json()
+    before = _value("db_statement_seconds_count", kind="SELECT", endpoint="/orders/{order_id}")
+    waits = _value("db_pool_checkout_wait_seconds_count", pool="sync")
+
+    assert client.get(f"/orders/{order['id']}").status_code == 200
+
+    assert _value("db_statement_seconds_count", kind="SELECT", endpoint="/orders/{order_id}") > before
+    assert _value("db_pool_checkout_wait_seconds_count", pool="sync") > waits
+    # Nothing is checked out between requests
+    assert _value("db_pool_connections", pool="sync", state="in_use") == 0
+    assert _value("db_pool_connections", pool="sync", state="idle") >= 1
+
+
+def test_slow_queries_are_logged(client, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "db_slow_query_ms", 0.000001)
+    with caplog.at_level(logging.WARNING, logger="app.db"):
+        client.post("/orders", json=BODY)
+
+    assert any("slow query" in r.message and "INSERT INTO orders" in r.message for r in caplog.records)
+    assert _value("db_slow_queries_total", kind="INSERT", endpoint="/orders") >= 1
+
+
+def test_a_checkout_is_observed_once_when_the_pool_retries(monkeypatch):
+    engine = create_engine(settings.database_url, poolclass=TimedQueuePool, pool_size=1, max_overflow=1)
+    pool = engine.pool
+    real_inc = pool._inc_overflow
+    lost = []
+
+    def inc_overflow():
+        # Lose the race for an overflow slot once: QueuePool._do_get calls itself again
+        if not lost:
+            lost.append(True)
+            return False
+        return real_inc()
+
+    monkeypatch.setattr(pool, "_inc_overflow", inc_overflow)
+    before = _value("db_pool_checkout_wait_seconds_count", pool="sync")
+    try:
+        engine.connect().close()
+    finally:
+        engine.dispose()
+    assert lost
+    assert _value("db_pool_checkout_wait_seconds_count", pool="sync") == before + 1
+
+
+def test_pool_gauges_follow_checkout_and_checkin():
+    engine = create_engine(
+        settings.database_url, poolclass=TimedReplicaQueuePool, pool_size=1, max_overflow=1,
+    )
+    instrument(engine)
+    state = lambda: (  # noqa: E731
+        _value("db_pool_connections", pool="replica", state="in_use"),
+        _value("db_pool_connections", pool="replica", state="idle"),
+    )
+    try:
+        first = engine.connect()
+        assert state() == (1, 0)
+        overflow = engine.connect()
+        assert state() == (2, 0)
+        overflow.close()  # takes the free slot in the pool
+        assert state() == (1, 1)
+        first.close()  # the pool is full, so this one is closed
+        assert state() == (0, 1)
+
+        engine.dispose()  # new pool, same listeners
+        engine.connect().close()
+        assert state() == (0, 1)
+    finally:
+        engine.dispose()
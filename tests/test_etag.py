@@ -0,0 +1,44 @@
+# tests/test_etag.py
+from sqlalchemy import event
+
+from app.db import engine
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 300, "currency": "USD"}
+
+
+def test_conditional_gets_follow_the_order_version(client):
+    order = client.post("/orders", json=BODY).json()
+    paths = [f"/orders/{order['id']}", f"/orders/{order['id']}/ledger", f"/orders/{order['id']}/ledger/summary"]
+
+    tags = {p: client.get(p).headers["ETag"] for p in paths}
+    assert set(tags.values()) == {'"v1"'}
+    for p in paths:
+        r = client.get(p, headers={"If-None-Match": tags[p]})
+        assert r.status_code == 304 and r.content == b"" and r.headers["ETag"] == tags[p]
+
+    # Paying and refunding each change every representation's ETag
+    for step, key in (("pay", "et-pay"), ("refund", "et-refund")):
+        client.post(f"/orders/{order['id']}/{step}", headers={"Idempotency-Key": key})
+        for p in paths:
+            r = client.get(p, headers={"If-None-Match": tags[p]})
+            assert r.status_code == 200 and r.headers["ETag"] != tags[p]
+            tags[p] = r.headers["ETag"]
+
+    assert client.get(paths[0]).json()["status"] == "PAID"
+    assert client.get(paths[0], headers={"If-None-Match": f'"v0", W/{tags[paths[0]]}'}).status_code == 304
+
+
+def test_not_modified_skips_the_ledger_query(client):
+    order = client.post("/orders", json=BODY).json()
+    client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "et-q"})
+    etag = client.get(f"/orders/{order['id']}/ledger").headers["ETag"]
+
+    statements = []
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert client.get(f"/orders/{order['id']}/ledger", headers={"If-None-Match": etag}).status_code == 304
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert not [s for s in statements if "ledger_lines" in s]
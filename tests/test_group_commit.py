@@ -0,0 +1,98 @@
+# tests/test_group_commit.py
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import SessionLocal, engine
+from app.services.group_commit import group_committer
+from app.services.payments import pay_order_idempotent
+from app.services.refunds import refund_order_idempotent
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 300, "currency": "USD"}
+
+
+@pytest.fixture
+def grouped(monkeypatch):
+    monkeypatch.setattr(settings, "group_commit_enabled", True)
+    monkeypatch.setattr(group_committer, "window_secs", 0.2)
+    group_committer.start()
+    yield
+    group_committer.stop()
+
+
+def _call(fn, order_id, key):
+    try:
+        with SessionLocal() as db:
+            return fn(db, order_id, key)[0]
+    except HTTPException as e:
+        return e.status_code
+
+
+def test_concurrent_payments_share_one_commit(client, grouped):
+    orders = [client.post("/orders", json=BODY).json()["id"] for _ in range(8)]
+    batches = REGISTRY.get_sample_value("group_commit_batch_size_count") or 0
+
+    calls = [(pay_order_idempotent, o, f"g-{o}") for o in orders]
+    calls.append((pay_order_idempotent, str(uuid4()), "g-missing"))       # 404 rolls back alone
+    calls.append((pay_order_idempotent, orders[0], f"g-{orders[0]}"))     # duplicate key, replayed
+    with ThreadPoolExecutor(len(calls)) as pool:
+        statuses = list(pool.map(lambda c: _call(*c), calls))
+
+    assert statuses == [200] * 8 + [404, 200]
+    assert (REGISTRY.get_sample_value("group_commit_batch_size_count") or 0) - batches < len(calls)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM ledger_lines")).scalar() == 16
+        assert conn.execute(text("SELECT count(*) FROM orders WHERE status = 'PAID'")).scalar() == 8
+        assert conn.execute(text("SELECT count(*) FROM idempotency_keys")).scalar() == 8
+    assert client.get("/accounts/CASH/balance", params={"currency": "USD"}).json()["balance_cents"] == 2400
+
+
+def test_pay_then_refund_in_same_batch_keeps_order(client, grouped):
+    order_id = client.post("/orders", json=BODY).json()["id"]
+    batches = REGISTRY.get_sample_value("group_commit_batch_size_count") or 0
+
+    with ThreadPoolExecutor(2) as pool:  # queued in this order, inside one window
+        pay = pool.submit(_call, pay_order_idempotent, order_id, "gp")
+        time.sleep(0.05)
+        refund = pool.submit(_call, refund_order_idempotent, order_id, "gr")
+    assert pay.result() == 200 and refund.result() == 200
+    assert REGISTRY.get_sample_value("group_commit_batch_size_count") - batches == 1
+
+    summary = client.get(f"/orders/{order_id}/ledger/summary").json()
+    assert summary["total_debits"] == summary["total_credits"] == 600
+
+
+def test_disabled_group_commit_stays_out_of_the_hot_path(client, monkeypatch):
+    monkeypatch.setattr(settings, "group_commit_enabled", False)
+    monkeypatch.delitem(sys.modules, "app.services.group_commit")
+    order = client.post("/orders", json=BODY).json()
+
+    assert client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "no-gc"}).status_code == 200
+    assert "app.services.group_commit" not in sys.modules
+
+
+def test_stop_with_operations_queued_answers_every_caller(client, grouped, monkeypatch):
+    monkeypatch.setattr(group_committer, "window_secs", 1.0)
+    orders = [client.post("/orders", json=BODY).json()["id"] for _ in range(3)]
+
+    with ThreadPoolExecutor(len(orders)) as pool:
+        futures = [pool.submit(_call, pay_order_idempotent, o, f"s-{o}") for o in orders]
+        time.sleep(0.1)  # all queued, the window is still open
+        group_committer.stop()
+        statuses = [f.result(timeout=5) for f in futures]
+    assert statuses == [200, 200, 200]
+
+    # A request that lost the race with stop() runs its own transaction instead of hanging
+    assert group_committer.run("pay", "late", "fp", lambda s, w: {}) is None
+    order = client.post("/orders", json=BODY).json()["id"]
+    assert _call(pay_order_idempotent, order, "after-stop") == 200
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM orders WHERE status = 'PAID'")).scalar() == 4
@@ -0,0 +1,39 @@
+# tests/test_idempotency_bytes.py
+from sqlalchemy import text
+
+from app.db import engine
+from app.services.idempotency_cache import response_cache
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 700, "currency": "USD"}
+
+
+def test_replays_are_byte_identical(client):
+    order = client.post("/orders", json=BODY).json()
+
+    r1 = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "bytes"})
+    with engine.connect() as conn:
+        stored, content_type = conn.execute(
+            text("SELECT response_bytes, content_type FROM idempotency_keys WHERE key = 'bytes'")
+        ).one()
+    assert bytes(stored) == r1.content
+    assert content_type == r1.headers["content-type"] == "application/json"
+
+    r2 = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "bytes"})  # from the cache
+    response_cache.clear()
+    r3 = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "bytes"})  # from Postgres
+    assert r1.content == r2.content == r3.content
+    assert r3.json() == {"order_id": order["id"], "status": "PAID"}
+
+
+def test_legacy_json_rows_still_replay(client):
+    order = client.post("/orders", json=BODY).json()
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO idempotency_keys (key, status_code, response_body) VALUES ('old', 200, CAST(:b AS json))"),
+            {"b": f'{{"order_id": "{order["id"]}", "status": "PAID"}}'},
+        )
+
+    r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "old"})
+    assert r.status_code == 200
+    assert r.json() == {"order_id": order["id"], "status": "PAID"}
+    assert client.get(f"/orders/{order['id']}").json()["status"] == "PENDING"  # nothing re-executed
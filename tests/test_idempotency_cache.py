@@ -0,0 +1,49 @@
+# tests/test_idempotency_cache.py
+from sqlalchemy import event
+
+from app.db import engine
+from app.services import idempotency_cache
+from app.services.idempotency_cache import ResponseCache, response_cache
+
+
+def test_cache_evicts_least_recently_used_and_expired(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(idempotency_cache, "monotonic", lambda: clock[0])
+
+    cache = ResponseCache(maxsize=2, ttl=10)
+    cache.put("a", "fp-a", 200, b'{"n":1}')
+    cache.put("b", "fp-b", 200, b'{"n":2}')
+    assert cache.get("a", "pay").body == b'{"n":1}'   # 'a' is now most recent
+
+    cache.put("c", "fp-c", 200, b'{"n":3}')         # over size -> drops 'b'
+    assert cache.get("b", "pay") is None
+    assert len(cache) == 2
+
+    clock[0] += 11                                  # past TTL
+    assert cache.get("a", "pay") is None
+    assert cache.get("c", "pay") is None
+
+
+def test_replay_is_served_from_cache_and_keeps_409(client):
+    body = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 250, "currency": "USD"}
+    a = client.post("/orders", json=body).json()
+    b = client.post("/orders", json=body).json()
+
+    r1 = client.post(f"/orders/{a['id']}/pay", headers={"Idempotency-Key": "cached-key"})
+    assert r1.status_code == 200
+    assert response_cache.get("cached-key", "pay").fingerprint == f"POST:/orders/{a['id']}/pay"
+
+    # From here on the DB must not be consulted for this key
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        r2 = client.post(f"/orders/{a['id']}/pay", headers={"Idempotency-Key": "cached-key"})
+        r3 = client.post(f"/orders/{b['id']}/pay", headers={"Idempotency-Key": "cached-key"})
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert r2.status_code == 200 and r2.json() == r1.json()
+    assert r3.status_code == 409
+    assert statements == []
@@ -0,0 +1,27 @@
+# tests/test_idempotency_gc.py
+from datetime import timedelta
+
+from sqlalchemy import text
+
+from app.db import engine
+from app.services.idempotency_gc import sweep_expired_keys
+
+
+def test_sweeper_deletes_expired_keys_in_batches_but_not_in_flight_ones():
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO idempotency_keys (key, status_code, response_body, created_at) "
+            "SELECT 'old-' || g, 200, '{}'::json, now() - interval '10 days' FROM generate_series(1, 25) g"
+        ))
+        conn.execute(text(
+            "INSERT INTO idempotency_keys (key, locked_until, created_at) "
+            "VALUES ('old-inflight', now() + interval '1 minute', now() - interval '10 days')"
+        ))
+        conn.execute(text("INSERT INTO idempotency_keys (key, status_code, response_body) VALUES ('fresh', 200, '{}')"))
+
+    deleted = sweep_expired_keys(engine, timedelta(days=7), batch_size=10, pause_secs=0)
+    assert deleted == 25
+
+    with engine.connect() as conn:
+        left = set(conn.execute(text("SELECT key FROM idempotency_keys")).scalars())
+    assert left == {"old-inflight", "fresh"}
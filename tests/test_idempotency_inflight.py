@@ -0,0 +1,39 @@
+# tests/test_idempotency_inflight.py
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from app.db import engine
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 800, "currency": "USD"}
+
+
+def test_key_held_by_running_request_returns_425(client):
+    order = client.post("/orders", json=BODY).json()
+
+    # Simulate another request that claimed 'busy' and hasn't committed yet
+    with engine.connect() as other:
+        other.execute(text("BEGIN"))
+        other.execute(text("SELECT pg_advisory_xact_lock(hashtextextended('busy', 0))"))
+
+        r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "busy"})
+        assert r.status_code == 425
+
+        other.execute(text("ROLLBACK"))
+
+    # Once the owner is gone the key is free again
+    r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "busy"})
+    assert r.status_code == 200
+
+
+def test_failed_request_leaves_no_claim_behind(client):
+    r = client.post(f"/orders/{uuid4()}/pay", headers={"Idempotency-Key": "k404"})
+    assert r.status_code == 404
+
+    # The claim rolled back with the transaction -> nothing stuck for 15s
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM idempotency_keys WHERE key = 'k404'")).scalar() == 0
+
+    order = client.post("/orders", json=BODY).json()
+    r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "k404"})
+    assert r.status_code == 200  # key was never bound, so it can be used for another order
@@ -0,0 +1,62 @@
+# tests/test_idempotency_wait.py
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import engine
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 800, "currency": "USD"}
+
+
+def _owner_commits_after(conn, order_id, delay):
+    time.sleep(delay)
+    conn.execute(
+        text("UPDATE idempotency_keys SET status_code = 200, response_body = CAST(:body AS json) WHERE key = 'slow'"),
+        {"body": f'{{"order_id": "{order_id}", "status": "PAID"}}'},
+    )
+    conn.execute(text("COMMIT"))
+
+
+def test_duplicate_waits_for_owner_and_replays(client, monkeypatch):
+    monkeypatch.setattr(settings, "idempotency_wait_secs", 5.0)
+    order = client.post("/orders", json=BODY).json()
+
+    # Another request has claimed 'slow' and is still running
+    with engine.connect() as other:
+        other.execute(text("BEGIN"))
+        other.execute(
+            text(
+                "INSERT INTO idempotency_keys (key, request_fingerprint) "
+                "SELECT 'slow', CAST(:fp AS varchar) WHERE pg_try_advisory_xact_lock(hashtextextended('slow', 0))"
+            ),
+            {"fp": f"POST:/orders/{order['id']}/pay"},
+        )
+        owner = threading.Thread(target=_owner_commits_after, args=(other, order["id"], 0.3))
+        owner.start()
+
+        r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "slow"})
+        owner.join()
+
+    # The owner's response is replayed; this request ran no side effects of its own
+    assert r.status_code == 200
+    assert r.json() == {"order_id": order["id"], "status": "PAID"}
+    assert client.get(f"/orders/{order['id']}").json()["status"] == "PENDING"
+
+
+def test_wait_times_out_with_425(client, monkeypatch):
+    monkeypatch.setattr(settings, "idempotency_wait_secs", 0.2)
+    order = client.post("/orders", json=BODY).json()
+
+    with engine.connect() as other:
+        other.execute(text("BEGIN"))
+        other.execute(text("SELECT pg_advisory_xact_lock(hashtextextended('stuck', 0))"))
+
+        r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "stuck"})
+        assert r.status_code == 425
+
+        other.execute(text("ROLLBACK"))
+
+    r = client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "stuck"})
+    assert r.status_code == 200
@@ -0,0 +1,46 @@
+# tests/test_journal.py
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db import engine
+from app.services.journal import journal_groups
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 400, "currency": "USD"}
+
+
+def _rows(order_id, *accounts):
+    return [{"order_id": order_id, "account": a, "debit_cents": 1, "credit_cents": 0} for a in accounts]
+
+
+def test_journal_groups_split_on_order_and_repeated_account():
+    a, b = uuid4(), uuid4()
+    rows = _rows(a, "CASH", "REVENUE") + _rows(a, "REVENUE", "CASH") + _rows(b, "CASH", "REVENUE")
+    assert [(order_id, len(group)) for order_id, group in journal_groups(rows)] == [(a, 2), (a, 2), (b, 2)]
+
+
+def test_journal_model_writes_postings_behind_the_same_ledger(client, monkeypatch):
+    legacy = client.post("/orders", json=BODY).json()
+    client.post(f"/orders/{legacy['id']}/pay", headers={"Idempotency-Key": "jr-legacy"})
+
+    monkeypatch.setattr(settings, "ledger_model", "journal")
+    order = client.post("/orders", json=BODY).json()
+    client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "jr-pay"})
+    client.post(f"/orders/{order['id']}/refund", headers={"Idempotency-Key": "jr-refund"})
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM journal_transactions")).scalar() == 2
+        assert conn.execute(text("SELECT count(*) FROM postings")).scalar() == 4
+        assert conn.execute(text("SELECT count(*) FROM ledger_entries")).scalar() == 2  # legacy rows stay put
+
+    # /ledger reads both models in the old shape
+    for o in (legacy, order):
+        lines = client.get(f"/orders/{o['id']}/ledger").json()
+        assert {"id", "order_id", "account", "debit_cents", "credit_cents"} <= set(lines[0])
+    lines = client.get(f"/orders/{order['id']}/ledger").json()
+    assert len({line["id"] for line in lines}) == 4
+    assert sorted((line["account"], line["debit_cents"], line["credit_cents"]) for line in lines) == [
+        ("CASH", 0, 400), ("CASH", 400, 0), ("REVENUE", 0, 400), ("REVENUE", 400, 0),
+    ]
+    assert client.get(f"/orders/{order['id']}/ledger/summary").json()["total_debits"] == 800
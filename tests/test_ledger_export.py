@@ -0,0 +1,67 @@
+# tests/test_ledger_export.py
+import gzip
+import json
+from datetime import datetime, timezone
+
+from app.services.ledger_export import accepts_gzip, stream_ledger
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 420, "currency": "USD"}
+RANGE = {"from": "2000-01-01T00:00:00Z", "to": "2100-01-01T00:00:00Z"}
+
+
+def _paid_order(client, key):
+    order = client.post("/orders", json=BODY).json()
+    client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": key})
+    return order
+
+
+def test_export_ndjson_and_csv(client):
+    a = _paid_order(client, "e1")
+    _paid_order(client, "e2")
+
+    r = client.get("/ledger/export", params=RANGE, headers={"Accept-Encoding": "identity"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(x) for x in r.text.splitlines()]
+    assert len(lines) == 4
+    assert {x["account"] for x in lines if x["order_id"] == a["id"]} == {"CASH", "REVENUE"}
+    assert sum(x["debit_cents"] for x in lines) == sum(x["credit_cents"] for x in lines) == 840
+
+    r = client.get("/ledger/export", params={**RANGE, "format": "csv"}, headers={"Accept-Encoding": "identity"})
+    rows = r.text.splitlines()
+    assert rows[0] == "id,order_id,account,debit_cents,credit_cents,created_at"
+    assert len(rows) == 5
+
+    # nothing before the range
+    r = client.get("/ledger/export", params={"from": "2000-01-01T00:00:00Z", "to": "2000-02-01T00:00:00Z"})
+    assert r.content == b""
+
+
+def test_export_gzip_on_the_fly(client):
+    _paid_order(client, "g1")
+    r = client.get("/ledger/export", params=RANGE, headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert len(r.text.splitlines()) == 2  # httpx inflated it for us
+
+    r = client.get("/ledger/export", params=RANGE, headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert "content-encoding" not in r.headers
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert len(r.content.splitlines()) == 2
+
+    # the generator itself emits one valid gzip stream across chunks
+    start, end = datetime(2000, 1, 1, tzinfo=timezone.utc), datetime(2100, 1, 1, tzinfo=timezone.utc)
+    raw = b"".join(stream_ledger(start, end, "csv", gzip=True))
+    assert gzip.decompress(raw).decode().count("\n") == 3  # header + 2 rows
+
+
+def test_accepts_gzip_honours_q_values():
+    assert accepts_gzip("gzip") and accepts_gzip("deflate, GZIP;q=0.5") and accepts_gzip("*")
+    assert not accepts_gzip("") and not accepts_gzip("identity")
+    assert not accepts_gzip("gzip;q=0, identity") and not accepts_gzip("gzip; q=0.0")
+    assert not accepts_gzip("*, gzip;q=0") and not accepts_gzip("*;q=0")
+
+
+def test_export_rejects_empty_range(client):
+    r = client.get("/ledger/export", params={"from": RANGE["to"], "to": RANGE["from"]})
+    assert r.status_code == 400
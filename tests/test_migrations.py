@@ -0,0 +1,56 @@
+# tests/test_migrations.py
+from datetime import date
+
+from sqlalchemy import text
+
+from app.db import engine
+from app.migrations import SCHEMA_VERSION, _create_month_partition, current_version, ensure_ledger_partitions, migrate
+
+
+def test_migrations_are_recorded_and_rerun_is_noop(client):
+    migrate(engine)  # startup already ran them
+    assert migrate(engine) == []
+    with engine.connect() as conn:
+        assert current_version(conn) == SCHEMA_VERSION
+        indexes = set(conn.execute(text("SELECT indexname FROM pg_indexes")).scalars())
+    assert {
+        "ix_ledger_entries_order_id_created_at_id",
+        "ix_orders_user_id_created_at",
+        "ix_orders_created_at_id",
+        "ix_idempotency_keys_created_at",
+        "ix_ledger_entries_created_at_brin",
+    } <= indexes
+
+
+def test_ledger_is_partitioned_and_partitions_are_created_ahead(client):
+    with engine.begin() as conn:
+        first = ensure_ledger_partitions(conn, months_ahead=2)
+        again = ensure_ledger_partitions(conn, months_ahead=2)
+        partitions = set(conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'ledger_entries'::regclass"
+        )).scalars())
+    assert len(first) == 3 and first == again
+    assert set(first) <= partitions and "ledger_entries_default" in partitions
+
+
+def test_month_partition_takes_its_rows_out_of_the_default_partition(client):
+    order = client.post("/orders", json={
+        "user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 100, "currency": "USD",
+    }).json()
+    with engine.begin() as conn:
+        # A row for a month that has no partition yet lands in the default one
+        conn.execute(text(
+            "INSERT INTO ledger_entries (id, order_id, account, debit_cents, credit_cents, created_at) "
+            "VALUES (gen_random_uuid(), :o, 'CASH', 100, 0, '2099-03-15 12:00:00+00')"
+        ), {"o": order["id"]})
+        assert conn.execute(text("SELECT count(*) FROM ledger_entries_default")).scalar() == 1
+    try:
+        with engine.begin() as conn:
+            _create_month_partition(conn, date(2099, 3, 1))
+            assert conn.execute(text("SELECT count(*) FROM ledger_entries_default")).scalar() == 0
+            assert conn.execute(text("SELECT count(*) FROM ledger_entries_y2099m03")).scalar() == 1
+            assert conn.execute(text("SELECT count(*) FROM ledger_entries")).scalar() == 1
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS ledger_entries_y2099m03"))
@@ -0,0 +1,26 @@
+# tests/test_orders_batch.py
+def test_batch_create_keeps_input_order_and_reports_bad_items(client):
+    user = "00000000-0000-0000-0000-000000000001"
+    items = [
+        {"user_id": user, "amount_cents": 100, "currency": "usd"},
+        {"user_id": user, "amount_cents": 0, "currency": "USD"},      # amount must be > 0
+        {"user_id": user, "amount_cents": 300, "currency": "EUR"},
+        {"user_id": "not-a-uuid", "amount_cents": 400, "currency": "USD"},
+    ]
+    r = client.post("/orders:batch", json={"orders": items})
+    assert r.status_code == 200
+    data = r.json()
+    assert data["created"] == 2 and data["failed"] == 2
+
+    results = data["results"]
+    assert [x["index"] for x in results] == [0, 1, 2, 3]
+    assert results[0]["order"]["amount_cents"] == 100
+    assert results[0]["order"]["currency"] == "USD"       # normalised like POST /orders
+    assert results[0]["order"]["status"] == "PENDING"
+    assert results[1]["order"] is None and results[1]["errors"][0]["loc"] == ["amount_cents"]
+    assert results[2]["order"]["amount_cents"] == 300
+    assert results[3]["errors"][0]["loc"] == ["user_id"]
+
+    # created orders are real rows
+    got = client.get(f"/orders/{results[2]['order']['id']}")
+    assert got.status_code == 200 and got.json()["currency"] == "EUR"
@@ -0,0 +1,66 @@
+# tests/test_pagination.py
+from sqlalchemy import event
+
+from app.db import engine
+
+USER = "00000000-0000-0000-0000-000000000003"
+OTHER = "00000000-0000-0000-0000-000000000004"
+
+
+def test_orders_keyset_pages_cover_everything_once(client):
+    items = [{"user_id": USER, "amount_cents": 100 + i, "currency": "USD"} for i in range(7)]
+    items.append({"user_id": OTHER, "amount_cents": 999, "currency": "USD"})
+    client.post("/orders:batch", json={"orders": items})  # same created_at -> ties broken by id
+
+    seen, cursor = [], None
+    while True:
+        params = {"user_id": USER, "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/orders", params=params).json()
+        seen += [o["id"] for o in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 7
+
+    assert len(client.get("/orders", params={"status": "PAID"}).json()["items"]) == 0
+    assert client.get("/orders", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_include_ledger_uses_one_batched_query(client):
+    ids = []
+    for i in range(3):
+        o = client.post("/orders", json={"user_id": USER, "amount_cents": 50, "currency": "USD"}).json()
+        client.post(f"/orders/{o['id']}/pay", headers={"Idempotency-Key": f"pg{i}"})
+        ids.append(o["id"])
+
+    statements = []
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        page = client.get("/orders", params={"user_id": USER, "include_ledger": True}).json()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert [len(o["ledger_entries"]) for o in page["items"]] == [2, 2, 2]
+    assert len([s for s in statements if "FROM ledger_lines" in s]) == 1
+
+    # without the flag no ledger is loaded at all
+    plain = client.get("/orders", params={"user_id": USER}).json()
+    assert all(o["ledger_entries"] is None for o in plain["items"])
+
+
+def test_ledger_page(client):
+    o = client.post("/orders", json={"user_id": USER, "amount_cents": 75, "currency": "USD"}).json()
+    client.post(f"/orders/{o['id']}/pay", headers={"Idempotency-Key": "lp1"})
+    client.post(f"/orders/{o['id']}/refund", headers={"Idempotency-Key": "lp2"})
+
+    first = client.get(f"/orders/{o['id']}/ledger/page", params={"limit": 3}).json()
+    assert len(first["items"]) == 3 and first["next_cursor"]
+    second = client.get(
+        f"/orders/{o['id']}/ledger/page", params={"limit": 3, "cursor": first["next_cursor"]}
+    ).json()
+    assert len(second["items"]) == 1 and second["next_cursor"] is None
+    assert {x["id"] for x in first["items"]}.isdisjoint({x["id"] for x in second["items"]})
@@ -0,0 +1,78 @@
+# tests/test_payments_batch.py
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from app.db import SessionLocal, engine
+from app.models import IdempotencyKey
+from app.services.idempotency import _CLAIM_SQL
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 700, "currency": "USD"}
+
+
+def test_batch_pay_settles_orders_and_keeps_idempotency_semantics(client):
+    a = client.post("/orders", json=BODY).json()
+    b = client.post("/orders", json=BODY).json()
+    c = client.post("/orders", json=BODY).json()
+
+    # 'used' already belongs to order C via the single-order endpoint
+    assert client.post(f"/orders/{c['id']}/pay", headers={"Idempotency-Key": "used"}).status_code == 200
+
+    items = [
+        {"order_id": a["id"], "idempotency_key": "k-a"},
+        {"order_id": b["id"], "idempotency_key": "k-b"},
+        {"order_id": b["id"], "idempotency_key": "used"},    # key bound to C -> 409
+        {"order_id": str(uuid4()), "idempotency_key": "k-x"},  # unknown order -> 404
+        {"order_id": a["id"], "idempotency_key": "k-a"},      # duplicate inside batch -> same result
+    ]
+    r = client.post("/payments:batch", json={"items": items})
+    assert r.status_code == 200
+    res = r.json()["results"]
+    assert [x["status_code"] for x in res] == [200, 200, 409, 404, 200]
+    assert res[0]["body"] == {"order_id": a["id"], "status": "PAID"}
+    assert res[4]["body"] == res[0]["body"]
+
+    # exactly one DR/CR pair per order
+    for order in (a, b):
+        rows = client.get(f"/orders/{order['id']}/ledger").json()
+        assert len(rows) == 2
+        assert sum(x["debit_cents"] for x in rows) == sum(x["credit_cents"] for x in rows) == 700
+
+    # keys written by the batch replay through the single-order endpoint
+    again = client.post(f"/orders/{a['id']}/pay", headers={"Idempotency-Key": "k-a"})
+    assert again.status_code == 200 and again.json() == res[0]["body"]
+
+    # and replaying the batch is a no-op
+    r2 = client.post("/payments:batch", json={"items": items[:2]})
+    assert [x["status_code"] for x in r2.json()["results"]] == [200, 200]
+    assert len(client.get(f"/orders/{b['id']}/ledger").json()) == 2
+
+
+def test_batch_pay_deletes_the_claim_of_a_missing_order(client):
+    items = [{"order_id": str(uuid4()), "idempotency_key": "k-missing"}]
+    r = client.post("/payments:batch", json={"items": items})
+    assert [x["status_code"] for x in r.json()["results"]] == [404]
+
+    with SessionLocal() as db:
+        assert db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == "k-missing")) is None
+
+
+def test_batch_pay_answers_425_for_a_key_claimed_by_an_inflight_pay(client):
+    a = client.post("/orders", json=BODY).json()
+    b = client.post("/orders", json=BODY).json()
+
+    # A single /pay that has claimed its key but not committed yet
+    with engine.connect() as owner:
+        owner.execute(_CLAIM_SQL, {"key": "k-busy", "fingerprint": f"POST:/orders/{a['id']}/pay"})
+
+        items = [
+            {"order_id": b["id"], "idempotency_key": "k-free"},
+            {"order_id": a["id"], "idempotency_key": "k-busy"},
+        ]
+        r = client.post("/payments:batch", json={"items": items})
+        assert [x["status_code"] for x in r.json()["results"]] == [200, 425]
+        owner.rollback()
+
+    # Once the owner is gone the key is free again
+    r = client.post("/payments:batch", json={"items": items[1:]})
+    assert [x["status_code"] for x in r.json()["results"]] == [200]
@@ -0,0 +1,48 @@
+# tests/test_profiling.py
+import re
+
+from prometheus_client import REGISTRY
+
+from app.config import settings
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 650, "currency": "USD"}
+
+
+def _phase_count(endpoint: str, phase: str) -> float:
+    return REGISTRY.get_sample_value("payment_phase_seconds_count", {"endpoint": endpoint, "phase": phase}) or 0
+
+
+def test_pay_and_refund_record_every_phase(client):
+    order = client.post("/orders", json=BODY).json()
+    phases = ("cache_lookup", "claim", "lock_order", "ledger_write", "store_response", "commit")
+    before = {(e, p): _phase_count(e, p) for e in ("pay", "refund") for p in phases}
+
+    client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "ph-pay"})
+    client.post(f"/orders/{order['id']}/refund", headers={"Idempotency-Key": "ph-refund"})
+    for (endpoint, phase), count in before.items():
+        assert _phase_count(endpoint, phase) == count + 1, (endpoint, phase)
+
+    # A cached replay stops after the cache lookup
+    client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": "ph-pay"})
+    assert _phase_count("pay", "cache_lookup") == before[("pay", "cache_lookup")] + 2
+    assert _phase_count("pay", "claim") == before[("pay", "claim")] + 1
+
+
+def test_admin_profile_is_guarded(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert client.post("/admin/profile", params={"seconds": 0.1}).status_code == 404
+
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    r = client.post("/admin/profile", params={"seconds": 0.1}, headers={"X-Admin-Token": "nope"})
+    assert r.status_code == 403
+    r = client.post("/admin/profile", params={"seconds": 0.1}, headers={"X-Admin-Token": "café".encode("latin-1")})
+    assert r.status_code == 403
+
+
+def test_admin_profile_returns_folded_stacks(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    r = client.post("/admin/profile", params={"seconds": 0.2, "interval_ms": 5}, headers={"X-Admin-Token": "s3cret"})
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    lines = r.text.splitlines()
+    assert lines and all(re.fullmatch(r".+ \d+", line) for line in lines)
+    assert any("MainThread;" in line for line in lines)
@@ -0,0 +1,64 @@
+# tests/test_reconciliation.py
+import json
+
+from sqlalchemy import text
+
+from app.db import engine
+from app.services.reconciliation import order_ranges, reconcile
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 900, "currency": "USD"}
+
+
+def _paid_order(client, key: str) -> str:
+    order = client.post("/orders", json=BODY).json()
+    client.post(f"/orders/{order['id']}/pay", headers={"Idempotency-Key": key})
+    return order["id"]
+
+
+def test_order_ranges_cover_the_uuid_space():
+    ranges = order_ranges(4)
+    assert ranges[0][0] == "00000000-0000-0000-0000-000000000000"
+    assert ranges[-1][1] is None
+    assert all(hi == next_lo for (_, hi), (next_lo, _) in zip(ranges, ranges[1:]))
+
+
+def test_clean_ledger_reconciles(client):
+    order_id = _paid_order(client, "rc-pay")
+    client.post(f"/orders/{order_id}/refund", headers={"Idempotency-Key": "rc-refund"})
+    client.post("/orders", json=BODY)  # PENDING, no entries
+
+    report = reconcile(engine, ranges=4, workers=2)
+    assert report["ok"] and report["discrepancies"] == {}
+    assert (report["orders"], report["entries"]) == (2, 4)
+
+
+def test_discrepancies_are_reported(client):
+    double_refunded = _paid_order(client, "rc-a")
+    for key in ("rc-r1", "rc-r2"):  # the service allows a second full refund
+        client.post(f"/orders/{double_refunded}/refund", headers={"Idempotency-Key": key})
+    unpaid = client.post("/orders", json=BODY).json()["id"]
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE orders SET status = 'PAID' WHERE id = :id"), {"id": unpaid})
+        conn.execute(text("UPDATE account_balances SET debit_cents = debit_cents + 1 WHERE account = 'CASH'"))
+
+    report = reconcile(engine, ranges=4)
+    assert not report["ok"]
+    assert report["discrepancies"] == {
+        "refund_exceeds_payment": 1, "paid_without_one_payment": 1, "account_rollup_mismatch": 1,
+    }
+    offenders = {m.get("order_id"): m.get("problem") or m["check"] for m in report["mismatches"]}
+    assert offenders[double_refunded] == "refund_exceeds_payment"
+    assert offenders[unpaid] == "paid_without_one_payment"
+
+
+def test_resumes_from_checkpoint(client, tmp_path):
+    _paid_order(client, "rc-cp")
+    checkpoint = tmp_path / "reconcile.json"
+    # Range 0 already done by an interrupted run (its result is taken as-is)
+    done = {"0": {"orders": 5, "totals": [], "problems": {"order_unbalanced": 1}, "samples": []}}
+    checkpoint.write_text(json.dumps({"ranges": 2, "done": done}))
+
+    report = reconcile(engine, ranges=2, checkpoint=str(checkpoint))
+    assert report["resumed_ranges"] == 1
+    assert report["orders"] >= 5 and report["discrepancies"]["order_unbalanced"] == 1
+    assert not checkpoint.exists()
@@ -0,0 +1,65 @@
+# tests/test_replica.py
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import replica
+from app.db import engine
+from app.migrations import migrate
+from app.models import Base
+
+BODY = {"user_id": "00000000-0000-0000-0000-000000000001", "amount_cents": 900, "currency": "USD"}
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    """A second database on the local server standing in for the read replica."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(text("SELECT 1 FROM pg_database WHERE datname = 'mintguard_replica'")).scalar():
+            conn.execute(text("CREATE DATABASE mintguard_replica ENCODING 'UTF8' TEMPLATE template0"))
+    replica_engine = create_engine(engine.url.set(database="mintguard_replica"))
+    migrate(replica_engine)  # same schema as the primary
+    tables = ", ".join(t.name for t in Base.metadata.sorted_tables if t.name != "accounts")
+    with replica_engine.begin() as conn:
+        conn.exec_driver_sql(f"TRUNCATE TABLE {tables} CASCADE")
+
+    monkeypatch.setattr(replica, "read_engine", replica_engine)
+    monkeypatch.setattr(replica, "ReadSessionLocal", sessionmaker(bind=replica_engine, autoflush=False))
+    yield replica_engine
+    replica_engine.dispose()
+
+
+def test_reads_go_to_the_replica_unless_asked_for_fresh_data(client, standin):
+    r = client.post("/orders", json=BODY)
+    order_id = r.json()["id"]
+    assert "x-lsn" in r.headers
+
+    # Not replicated yet: the replica doesn't have it...
+    assert client.get(f"/orders/{order_id}").status_code == 404
+    # ...but read-your-writes goes to the primary
+    r = client.get(f"/orders/{order_id}", headers={"X-Read-Your-Writes": "true"})
+    assert r.status_code == 200 and r.json()["amount_cents"] == 900
+
+    with standin.begin() as conn:
+        conn.execute(
+            text("INSERT INTO orders (id, user_id, amount_cents, currency, status) "
+                 "VALUES (:id, :user_id, 901, 'USD', 'PENDING')"),
+            {"id": order_id, "user_id": BODY["user_id"]},
+        )
+    assert client.get(f"/orders/{order_id}").json()["amount_cents"] == 901  # served by the replica
+
+
+def test_min_lsn_falls_back_to_primary_when_replica_is_behind(client, standin):
+    order_id = client.post("/orders", json=BODY).json()["id"]
+
+    assert client.get(f"/orders/{order_id}/ledger", headers={"X-Min-LSN": "0/0"}).status_code == 404
+    r = client.get(f"/orders/{order_id}/ledger", headers={"X-Min-LSN": "FFFFFFFF/FFFFFFFF"})
+    assert r.status_code == 200 and r.json() == []
+
+    assert client.get(f"/orders/{order_id}", headers={"X-Min-LSN": "nope"}).status_code == 400
+
+
+def test_without_replica_everything_reads_from_primary(client):
+    r = client.post("/orders", json=BODY)
+    assert "x-lsn" not in r.headers
+    assert client.get(f"/orders/{r.json()['id']}").status_code == 200
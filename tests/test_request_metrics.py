@@ -0,0 +1,41 @@
+# tests/test_request_metrics.py
+import os
+import subprocess
+import sys
+from uuid import uuid4
+
+from prometheus_client import REGISTRY
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_are_counted_by_route_template(client):
+    labels = {"method": "GET", "route": "/orders/{order_id}", "status": "404"}
+    before = _value("http_requests_total", **labels)
+    timed = _value("http_request_duration_seconds_count", method="GET", route="/orders/{order_id}")
+
+    client.get(f"/orders/{uuid4()}")
+    client.get(f"/orders/{uuid4()}")
+    client.get("/no/such/route")
+
+    assert _value("http_requests_total", **labels) == before + 2
+    assert _value("http_request_duration_seconds_count", method="GET", route="/orders/{order_id}") == timed + 2
+    assert _value("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+
+
+_WORKER = "from app.metrics import payments_total; payments_total.inc(3)"
+_SCRAPE = """
+from starlette.testclient import TestClient
+from app.metrics import metrics_asgi_app
+print(TestClient(metrics_asgi_app).get("/").text)
+"""
+
+
+def test_multiprocess_mode_aggregates_workers(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):  # two "workers"
+        subprocess.run([sys.executable, "-c", _WORKER], env=env, check=True)
+    out = subprocess.run([sys.executable, "-c", _SCRAPE], env=env, check=True, capture_output=True, text=True)
+    assert "payments_total 6.0" in out.stdout.splitlines()  # both workers, served by a third process
@@ -0,0 +1,49 @@
+# tests/test_startup.py
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app import migrations
+from app.config import settings
+from app.db import engine, warm_pool
+from app.main import app
+
+
+def test_verify_mode_boots_without_ddl(monkeypatch):
+    monkeypatch.setattr(settings, "startup_mode", "verify")
+    monkeypatch.setattr(migrations, "migrate", lambda engine: pytest.fail("verify mode must not migrate"))
+
+    with TestClient(app) as c:
+        assert c.get("/healthz").json() == {"ok": True, "db": "up"}
+
+
+def test_verify_mode_refuses_outdated_schema(monkeypatch):
+    monkeypatch.setattr(settings, "startup_mode", "verify")
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", migrations.SCHEMA_VERSION + 1)
+
+    with pytest.raises(RuntimeError, match="app.cli migrate"):
+        with TestClient(app):
+            pass
+
+
+def test_verify_mode_boots_on_a_newer_schema(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "startup_mode", "verify")
+    ahead = migrations.SCHEMA_VERSION + 1
+    with engine.begin() as conn:
+        conn.execute(migrations.schema_migrations.insert().values(version=ahead, description="from a newer build"))
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.migrations"), TestClient(app) as c:
+            assert c.get("/healthz").status_code == 200
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(migrations.schema_migrations).where(migrations.schema_migrations.c.version == ahead))
+    assert any("ahead of this build" in r.message for r in caplog.records)
+
+
+def test_warm_pool_leaves_connections_idle():
+    engine.dispose()
+    assert warm_pool(engine, 3) == 3
+    assert engine.pool.checkedin() >= 3
+    assert engine.pool.checkedout() == 0